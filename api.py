@@ -0,0 +1,169 @@
+import json
+from datetime import datetime
+from flask import Blueprint, Response, abort, request
+from models import db, Venue, Artist, Show
+from routing import read_only
+from search import search_page
+from schedule import parse_range, calendar
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Read-only mirror of the HTML views under /api/v1. List endpoints take
+# `fields=a,b` to select only those columns in SQL, and page with an
+# opaque `cursor` returned as `next_cursor`.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+DETAIL_FIELDS = ('past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count')
+
+
+def _default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+def json_response(payload, status=200):
+  if orjson is not None:
+    body = orjson.dumps(payload, option=orjson.OPT_PASSTHROUGH_SUBCLASS, default=list)
+  else:
+    body = json.dumps(payload, default=_default, separators=(',', ':'))
+  return Response(body, status=status, mimetype='application/json')
+
+def requested_fields(allowed):
+  # Fields named by `fields=`, or all of `allowed`; 400 for unknown ones.
+  fields = request.args.get('fields')
+  if not fields:
+    return list(allowed)
+  fields = [field.strip() for field in fields.split(',') if field.strip()]
+  if not set(fields) <= set(allowed):
+    abort(400)
+  return fields
+
+def requested_limit():
+  limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+  return min(max(limit, 1), MAX_LIMIT)
+
+def entity_columns(model):
+  return [column.name for column in model.__table__.columns if column.name not in ('updated_at', 'deleted_at')]
+
+
+def list_entities(model):
+  fields = requested_fields(entity_columns(model))
+  limit = requested_limit()
+  try:
+    after = int(request.args.get('cursor', 0))
+  except ValueError:
+    abort(400)
+  columns = [model.id] + [getattr(model, field) for field in fields if field != 'id']
+  query = db.session.query(*columns)
+  for name in ('city', 'state'):
+    if request.args.get(name):
+      query = query.filter(getattr(model, name) == request.args[name])
+  rows = query.filter(model.id > after).order_by(model.id).limit(limit).all()
+  return json_response({
+    "data": [{field: getattr(row, field) for field in fields} for row in rows],
+    "next_cursor": str(rows[-1].id) if len(rows) == limit else None
+  })
+
+def entity_detail(model, id):
+  fields = requested_fields(entity_columns(model) + list(DETAIL_FIELDS))
+  entity = model.query.get_or_404(id)
+  data = {field: getattr(entity, field) for field in fields if field not in DETAIL_FIELDS}
+  if set(fields) & set(DETAIL_FIELDS):
+    details = entity.show_details()
+    data.update((field, details[field]) for field in fields if field in DETAIL_FIELDS)
+  return json_response({"data": data})
+
+
+@api.route('/venues')
+@read_only
+def venues():
+  return list_entities(Venue)
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def venue(venue_id):
+  return entity_detail(Venue, venue_id)
+
+@api.route('/artists')
+@read_only
+def artists():
+  return list_entities(Artist)
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def artist(artist_id):
+  return entity_detail(Artist, artist_id)
+
+@api.route('/shows')
+@read_only
+def shows():
+  fields = requested_fields((
+    'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link', 'start_time'
+  ))
+  limit = requested_limit()
+  try:
+    after = Show.parse_cursor(request.args.get('cursor'))
+    before = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+  except ValueError:
+    abort(400)
+  rows = db.session.execute(Show.listing(after, limit, before=before)).all()
+  return json_response({
+    "data": [{field: getattr(row, field) for field in fields} for row in rows],
+    "next_cursor": Show.cursor(rows[-1]) if len(rows) == limit else None
+  })
+
+@api.route('/calendar')
+@read_only
+def show_calendar():
+  # /calendar?from=&to=&bucket=day|week|month; list the shows of a bucket
+  # with /shows?cursor=<bucket start>,0&to=<next bucket start>.
+  try:
+    start, end, unit = parse_range(request.args)
+  except ValueError:
+    abort(400)
+  return json_response({
+    "from": start,
+    "to": end,
+    "bucket": unit,
+    "data": [{"start": bucket, "count": count} for bucket, count in calendar(start, end, unit)]
+  })
+
+@api.route('/search')
+@read_only
+def search():
+  # /search?type=venues|artists&q=term; the cursor is the next page number.
+  model = {'venues': Venue, 'artists': Artist}.get(request.args.get('type', 'venues'))
+  if model is None:
+    abort(400)
+  fields = requested_fields(('id', 'name', 'num_upcoming_shows'))
+  limit = requested_limit()
+  page = request.args.get('cursor', 1, type=int)
+  count, rows = search_page(
+    model, request.args.get('q', ''),
+    page=max(page, 1), per_page=limit
+  )
+  return json_response({
+    "count": count,
+    "data": [{field: getattr(row, field) for field in fields} for row in rows],
+    "next_cursor": str(page + 1) if page * limit < count else None
+  })
+
+
+@api.errorhandler(400)
+def bad_request(error):
+  return json_response({"error": "bad request"}, 400)
+
+@api.errorhandler(404)
+def not_found(error):
+  return json_response({"error": "not found"}, 404)
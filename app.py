@@ -2,18 +2,38 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import hashlib
 import json
+import os
 import sys
-from datetime import datetime
-import babel
-from flask import Flask, render_template, jsonify, request, Response, abort, flash, redirect, url_for
+from datetime import datetime, timezone
+import babel.dates
+from flask import Flask, render_template, jsonify, request, Response, abort, flash, redirect, url_for, stream_with_context, make_response
+from werkzeug.http import is_resource_modified
 from flask_moment import Moment
 from sqlalchemy import func, literal
+from sqlalchemy.exc import IntegrityError
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from models import *
+from search import search_page, search_facets
+from facets import selected, clauses, facet_counts
+from schedule import BUCKETS, parse_range, next_bucket, calendar
+from cache import PageCache
+from pool import PoolMonitor
+from fanout import FanOut
+from instrumentation import QueryStats
+from metrics import Metrics
+from autocomplete import Autocomplete
+from routing import read_only
+from importer import import_command
+from exporter import FORMATS, export_query, serialize, encode, export_command
+from counters import roll_shows_command, recount_shows_command
+from purge import purge_venues_command
+from api import api
+import config
 from flask_migrate import Migrate
 #----------------------------------------------------------------------------#
 # App Config.
@@ -21,25 +41,145 @@ from flask_migrate import Migrate
 
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object('config')
+app.config.from_object(config.CONFIGS[os.environ.get('FLASK_CONFIG', 'production')])
+if not app.config['SECRET_KEY']:
+  raise RuntimeError('SECRET_KEY must be set in the environment')
 db.init_app(app)
 migrate = Migrate(app, db)
+cache = PageCache(app)
+pool = PoolMonitor(app)
+fanout = FanOut(app)
+query_stats = QueryStats(app)
+metrics = Metrics(app)
+autocomplete = Autocomplete(app)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(roll_shows_command)
+app.cli.add_command(recount_shows_command)
+app.cli.add_command(purge_venues_command)
+app.register_blueprint(api)
 
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+DATETIME_PATTERNS = {
+  'full': babel.dates.parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+  'medium': babel.dates.parse_pattern("EE MM, dd, y h:mma"),
+}
+DATETIME_LOCALE = babel.Locale.parse('en')
+
 def format_datetime(value, format='medium'):
-  date = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
+  # Views hand over datetime objects; the patterns and locale above are
+  # parsed once at import instead of on every call.
+  if isinstance(value, str):
+    value = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+  format = DATETIME_PATTERNS.get(format, format)
+  return babel.dates.format_datetime(value, format, locale=DATETIME_LOCALE)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+def page_validators(version):
+  # ETag over the whole version row of an entity page, Last-Modified from
+  # its updated_at or the start of its last show that has gone past,
+  # whichever is later. updated_at is in UTC, start_time in local time.
+  etag = hashlib.sha1(repr(tuple(version)).encode()).hexdigest()
+  updated_at, last_started = version
+  changes = [updated_at.replace(tzinfo=timezone.utc)]
+  if last_started is not None:
+    changes.append(last_started.astimezone(timezone.utc))
+  return etag, max(changes)
+
+def not_modified(version):
+  # 404 for a missing entity, a bare 304 when the client's copy is still
+  # current, or None when the page has to be rendered.
+  if version is None:
+    abort(404)
+  etag, last_modified = page_validators(version)
+  if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+    return None
+  return with_validators(Response(status=304), version)
+
+def with_validators(response, version):
+  etag, last_modified = page_validators(version)
+  response = make_response(response)
+  response.set_etag(etag)
+  response.last_modified = last_modified
+  response.cache_control.no_cache = True
+  return response
+
+#----------------------------------------------------------------------------#
+# Page data.
+#----------------------------------------------------------------------------#
+
+# Template data for the pages, shared by these views and the ASGI ones.
+
+def venue_page(venue, details):
+  return {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": venue.genres,
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website_link,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    **details
+  }
+
+def artist_page(artist, details):
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": artist.genres,
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website_link,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    **details
+  }
+
+def search_results(count, rows, page):
+  return {
+    "count": count,
+    "page": page,
+    "per_page": app.config['SEARCH_PAGE_SIZE'],
+    "data": [
+      {
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": row.num_upcoming_shows,
+      } for row in rows
+    ]
+  }
+
+def show_rows(rows):
+  # Lazily, so a streamed /shows page starts before the rows are read.
+  return (
+    {
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": show.start_time,
+      "cursor": Show.cursor(show)
+    } for show in rows
+  )
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -53,70 +193,46 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@cache.cached(tags=lambda: ['venues'])
 def venues():
-  # replace with real venues data.
-  # num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  citiesAndStateGroups = db.session.query(
-    Venue.state, 
-    Venue.city
-  ).group_by(Venue.state, Venue.city).all()
-  for group in citiesAndStateGroups:
-    data.append({
-      "city": group.city,
-      "state": group.state,
-      "venues": [{
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_show": venue.upcoming_shows()
-      } for venue in Venue.query.filter(
-        Venue.city == group.city,
-        Venue.state == group.state
-      ).all()]
-    })
-  return render_template('pages/venues.html', areas=data);
+  filters = selected(request.args)
+  data = Venue.areas(*clauses(Venue, filters, db.engine.dialect.name))
+  return render_template('pages/venues.html', areas=data,
+    filters=filters, facets=facet_counts(Venue, filters));
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   search_term = request.form.get('search_term', '')
-  looking_for = '%{0}%'.format(search_term)
-  data = Venue.query.filter(
-    Venue.name.ilike(looking_for)
-  ).all()
-  response={
-    "count": len(data),
-    "data": [
-      {
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": venue.upcoming_shows(),
-      } for venue in data
-    ]
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  page = max(request.form.get('page', 1, type=int), 1)
+  filters = selected(request.form)
+  count, data = search_page(
+    Venue, search_term,
+    page=page, per_page=app.config['SEARCH_PAGE_SIZE'], filters=filters
+  )
+  response = search_results(count, data, page)
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''),
+    filters=filters, facets=search_facets(Venue, search_term, filters))
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@cache.cached(tags=lambda venue_id: ['venue:{0}'.format(venue_id)])
 def show_venue(venue_id):
-  venue = Venue.query.get_or_404(venue_id)
-  data={
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website_link,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description": venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": venue.past_shows(),
-    "upcoming_shows": venue.upcoming_shows(), 
-    "past_shows_count": venue.past_shows_count(),
-    "upcoming_shows_count": venue.upcoming_shows_count()
-  }
-  return render_template('pages/show_venue.html', venue=data)
+  version = Venue.version(venue_id)
+  response = not_modified(version)
+  if response is not None:
+    return response
+  # The venue row and its shows do not depend on each other.
+  rows = fanout.run(
+    venue=Venue.detail_query(venue_id),
+    shows=Venue.show_details_query(venue_id)
+  )
+  if not rows['venue']:
+    abort(404)
+  data = venue_page(rows['venue'][0], partition_shows(rows['shows'], datetime.now()))
+  cache.tag(*['artist:{0}'.format(show["artist_id"]) for show in data["past_shows"] + data["upcoming_shows"]])
+  return with_validators(render_template('pages/show_venue.html', venue=data), version)
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -166,9 +282,12 @@ def create_venue_submission():
 def delete_venue(venue_id):
   # Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  # The venue is hidden right away and its rows are deleted later by
+  # `flask purge-venues`, see Venue.soft_delete().
   venue = Venue.query.get_or_404(venue_id)
+  id = venue.id
   try:
-    db.session.delete(venue)
+    artist_ids = venue.soft_delete()
     db.session.commit()
   except:
     db.session.rollback()
@@ -177,61 +296,58 @@ def delete_venue(venue_id):
     abort(500)
   finally:
     db.session.close()
-  return jsonify({ "id": venue.id })
+  cache.invalidate(*['artist:{0}'.format(artist_id) for artist_id in artist_ids])
+  return jsonify({ "id": id })
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
+@cache.cached(tags=lambda: ['artists'])
 def artists():
-  data = Artist.query.with_entities(Artist.id, Artist.name).all()
-  return render_template('pages/artists.html', artists=data)
+  filters = selected(request.args)
+  data = Artist.query.with_entities(Artist.id, Artist.name).filter(
+    *clauses(Artist, filters, db.engine.dialect.name)
+  ).all()
+  return render_template('pages/artists.html', artists=data,
+    filters=filters, facets=facet_counts(Artist, filters))
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   search_term = request.form.get('search_term', '')
-  looking_for = '%{0}%'.format(search_term)
-  data = Artist.query.filter(
-    Artist.name.ilike(looking_for)
-  ).all()
-
-  response={
-    "count": len(data),
-    "data": [
-      {
-        "id": artist.id,
-        "name": artist.name,
-        "num_upcoming_shows": artist.upcoming_shows(),
-      } for artist in data
-    ]
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  page = max(request.form.get('page', 1, type=int), 1)
+  filters = selected(request.form)
+  count, data = search_page(
+    Artist, search_term,
+    page=page, per_page=app.config['SEARCH_PAGE_SIZE'], filters=filters
+  )
+  response = search_results(count, data, page)
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''),
+    filters=filters, facets=search_facets(Artist, search_term, filters))
 
 @app.route('/artists/<int:artist_id>')
+@read_only
+@cache.cached(tags=lambda artist_id: ['artist:{0}'.format(artist_id)])
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.get_or_404(artist_id)
-  data={
-    "id": artist.id,
-    "name": artist.name,
-    "genres": artist.genres,
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website_link,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": artist.seeking_venue,
-    "seeking_description": artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": artist.past_shows(),
-    "upcoming_shows": artist.upcoming_shows(),
-    "past_shows_count": artist.past_shows_count(),
-    "upcoming_shows_count": artist.upcoming_shows_count(),
-  }
-  return render_template('pages/show_artist.html', artist=data)
+  version = Artist.version(artist_id)
+  response = not_modified(version)
+  if response is not None:
+    return response
+  rows = fanout.run(
+    artist=Artist.detail_query(artist_id),
+    shows=Artist.show_details_query(artist_id)
+  )
+  if not rows['artist']:
+    abort(404)
+  data = artist_page(rows['artist'][0], partition_shows(rows['shows'], datetime.now()))
+  cache.tag(*['venue:{0}'.format(show["venue_id"]) for show in data["past_shows"] + data["upcoming_shows"]])
+  return with_validators(render_template('pages/show_artist.html', artist=data), version)
 
 #  Update
 #  ----------------------------------------------------------------
@@ -372,31 +488,44 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+def stream_template(template_name, **context):
+  # Render a template chunk by chunk so the first bytes leave before the
+  # whole page (and any lazy query it iterates) has been produced.
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  return Response(stream_with_context(template.generate(context)))
+
+def parse_show_cursor(cursor):
+  try:
+    return Show.parse_cursor(cursor)
+  except ValueError:
+    abort(400)
+
 @app.route('/shows')
+@read_only
+@cache.cached(tags=lambda: ['shows'])
 def shows():
-  # displays list of shows at /shows
-  # replace with real venues data.
-  shows = db.session.query(Show).with_entities(
-    Show.venue_id, 
-    Show.artist_id, 
-    Show.start_time,
-    Venue.name.label('venue_name'), 
-    Artist.name.label('artist_name'),
-    Artist.image_link.label('artist_image_link'),
-  ).join(Show.venue).join(Show.artist).all()
-
-  data = [
-    {
-      "venue_id": show.venue_id,
-      "venue_name": show.venue_name,
-      "artist_id": show.artist_id,
-      "artist_name": show.artist_name,
-      "artist_image_link": show.artist_image_link,
-      "start_time": show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-    } for show in shows
-  ]
-
-  return render_template('pages/shows.html', shows=data)
+  after = parse_show_cursor(request.args.get('cursor'))
+  per_page = app.config['SHOWS_PAGE_SIZE']
+  data = show_rows(db.session.execute(Show.listing(after, per_page)))
+  if app.config['STREAM_SHOWS']:
+    return stream_template('pages/shows.html', shows=data, per_page=per_page)
+  return render_template('pages/shows.html', shows=data, per_page=per_page)
+
+@app.route('/calendar')
+@read_only
+@cache.cached(tags=lambda: ['shows'])
+def show_calendar():
+  try:
+    start, end, unit = parse_range(request.args)
+  except ValueError:
+    abort(400)
+  after = max(parse_show_cursor(request.args.get('cursor', 'all')), (start, 0))
+  per_page = app.config['SHOWS_PAGE_SIZE']
+  data = show_rows(db.session.execute(Show.listing(after, per_page, before=end)))
+  return render_template('pages/calendar.html', buckets=calendar(start, end, unit),
+    start=start, end=end, unit=unit, units=BUCKETS, next_bucket=next_bucket,
+    shows=data, per_page=per_page)
 
 @app.route('/shows/create')
 def create_shows():
@@ -413,16 +542,25 @@ def create_show_submission():
     abort(500)
 
   if form.validate_on_submit():
+    duration = form.duration_minutes.data or DEFAULT_SHOW_MINUTES
+    if Show.conflicts(venue.id, artist.id, form.start_time.data, duration):
+      flash('The venue or the artist is already booked at that time. Show could not be listed.')
+      return render_template('forms/new_show.html', form=form)
     try:
       show = Show(
         venue=venue,
         artist=artist,
-        start_time=form.start_time.data
+        start_time=form.start_time.data,
+        duration_minutes=duration
       )
-      db.session.add(venue)
+      db.session.add(show)
       db.session.commit()
       # on successful db insert, flash success
       flash('Show was successfully listed!')
+    except IntegrityError:
+      # Booked concurrently; the exclusion constraints reject the second.
+      db.session.rollback()
+      flash('The venue or the artist is already booked at that time. Show could not be listed.')
     except:
       db.session.rollback()
       error=True
@@ -435,6 +573,41 @@ def create_show_submission():
     flash('Your input is not valide. fill required fields with good type')
   return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+def parse_date_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+
+@app.route('/export/<any(venues, artists, shows):kind>')
+@read_only
+def export(kind):
+  format = request.args.get('format', 'csv')
+  if format not in FORMATS:
+    abort(400)
+  query = export_query(
+    kind,
+    city=request.args.get('city'),
+    state=request.args.get('state'),
+    since=parse_date_arg('from'),
+    until=parse_date_arg('to')
+  )
+  gzip = 'gzip' in request.accept_encodings
+  response = Response(
+    stream_with_context(encode(serialize(query, format), gzip=gzip)),
+    mimetype=FORMATS[format]
+  )
+  if gzip:
+    response.headers['Content-Encoding'] = 'gzip'
+  response.headers['Content-Disposition'] = 'attachment; filename={0}.{1}'.format(kind, format)
+  return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -452,7 +625,6 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
-    app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
 # Launch.
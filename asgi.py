@@ -0,0 +1,227 @@
+"""ASGI entry point for the read-only pages.
+
+/venues, /artists, /shows, the two searches and the venue/artist detail
+pages are answered here from an async SQLAlchemy engine (asyncpg for
+PostgreSQL), so one process keeps many slow queries in flight instead of
+blocking a worker per query. Every other request goes to the Flask app
+through asgiref's WSGI adapter. These pages skip the page cache and the
+conditional GET handling of the sync views.
+
+    pip install asyncpg asgiref uvicorn
+    uvicorn asgi:application --workers 4
+"""
+import asyncio
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app import app, venue_page, artist_page, search_results, show_rows
+from models import db, Venue, Artist, Show, partition_shows
+from search import TrigramSearch, search_page, search_page_queries, search_facets
+from facets import selected, clauses, facet_query, fold_facets
+
+#----------------------------------------------------------------------------#
+# Engine.
+#----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {
+  'postgresql': 'postgresql+asyncpg',
+  'sqlite': 'sqlite+aiosqlite',
+}
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+
+
+def async_engine(config):
+  url = config['SQLALCHEMY_DATABASE_URI']
+  scheme, rest = url.split('://', 1)
+  dialect = scheme.split('+')[0]
+  options = {
+    key: value for key, value in config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+    if key in POOL_OPTIONS
+  }
+  if dialect == 'postgresql':
+    connect_args = {}
+    if config['SQLALCHEMY_PGBOUNCER']:
+      # Transaction pooling cannot keep prepared statements across
+      # transactions, so asyncpg must not cache them.
+      connect_args['statement_cache_size'] = 0
+      rest += ('&' if '?' in rest else '?') + 'prepared_statement_cache_size=0'
+    elif config['SQLALCHEMY_STATEMENT_TIMEOUT']:
+      connect_args['server_settings'] = {
+        'statement_timeout': str(int(config['SQLALCHEMY_STATEMENT_TIMEOUT']))
+      }
+    options['connect_args'] = connect_args
+  return create_async_engine(ASYNC_DRIVERS[dialect] + '://' + rest, **options)
+
+
+engine = async_engine(app.config)
+Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+def render(path, method, template, status=200, headers=(), **context):
+  # Templates use url_for and request.endpoint, so render in a Flask
+  # request context for the same path.
+  with app.test_request_context(path, method=method):
+    return status, render_template(template, **context), list(headers)
+
+def server_timing(timings):
+  return ('server-timing', ', '.join(
+    '{0};dur={1:.1f}'.format(name, elapsed * 1000) for name, elapsed in timings
+  ))
+
+async def timed(name, statement):
+  # Each statement gets its own session, so its own pooled connection.
+  started = time.perf_counter()
+  async with Session() as session:
+    rows = (await session.execute(statement)).all()
+  return rows, (name, time.perf_counter() - started)
+
+def request_filters(values):
+  return selected({name: value[0] for name, value in values.items()})
+
+async def facets(model, filters, *criteria):
+  async with Session() as session:
+    rows = (await session.execute(facet_query(model, filters, engine.dialect.name, *criteria))).all()
+  return fold_facets(rows, engine.dialect.name)
+
+async def venues(request):
+  filters = request_filters(request['query'])
+  async with Session() as session:
+    rows = (await session.execute(Venue.areas_query(*clauses(Venue, filters, engine.dialect.name)))).all()
+  return render(request['path'], 'GET', 'pages/venues.html', areas=Venue.fold_areas(rows),
+    filters=filters, facets=await facets(Venue, filters))
+
+async def artists(request):
+  filters = request_filters(request['query'])
+  async with Session() as session:
+    rows = (await session.execute(db.select(Artist.id, Artist.name).filter(
+      *clauses(Artist, filters, engine.dialect.name)
+    ))).all()
+  return render(request['path'], 'GET', 'pages/artists.html', artists=rows,
+    filters=filters, facets=await facets(Artist, filters))
+
+async def shows(request):
+  try:
+    after = Show.parse_cursor(request['query'].get('cursor', [None])[0])
+  except ValueError:
+    return 400, 'Bad Request', []
+  per_page = app.config['SHOWS_PAGE_SIZE']
+  async with Session() as session:
+    rows = (await session.execute(Show.listing(after, per_page))).all()
+  return render(request['path'], 'GET', 'pages/shows.html', shows=show_rows(rows), per_page=per_page)
+
+async def detail(request, model, id):
+  # The entity row and its shows are fetched concurrently, as in the sync
+  # views (see fanout.py).
+  started = time.perf_counter()
+  (entity, entity_timing), (shows, shows_timing) = await asyncio.gather(
+    timed(model.__name__.lower(), model.detail_query(int(id))),
+    timed('shows', model.show_details_query(int(id)))
+  )
+  headers = [server_timing([entity_timing, shows_timing, ('fanout', time.perf_counter() - started)])]
+  if not entity:
+    return render(request['path'], 'GET', 'errors/404.html', status=404, headers=headers)
+  details = partition_shows(shows, datetime.now())
+  if model is Venue:
+    return render(request['path'], 'GET', 'pages/show_venue.html', headers=headers,
+      venue=venue_page(entity[0], details))
+  return render(request['path'], 'GET', 'pages/show_artist.html', headers=headers,
+    artist=artist_page(entity[0], details))
+
+async def search(request, model, template):
+  form = request['form']
+  search_term = form.get('search_term', [''])[0]
+  try:
+    page = max(int(form.get('page', ['1'])[0]), 1)
+  except ValueError:
+    page = 1
+  per_page = app.config['SEARCH_PAGE_SIZE']
+  filters = request_filters(form)
+  if engine.dialect.name == 'postgresql':
+    match, rank = TrigramSearch(model).match(search_term)
+    criteria = clauses(model, filters, engine.dialect.name)
+    rows, count = search_page_queries(model, match, rank, page, per_page, criteria)
+    async with Session() as session:
+      count = (await session.execute(count)).scalar()
+      rows = (await session.execute(rows)).all()
+    counts = await facets(model, filters, match)
+  else:
+    # The in-process search index is synchronous; keep it off the loop.
+    def run():
+      with app.app_context():
+        return (
+          search_page(model, search_term, page, per_page, filters),
+          search_facets(model, search_term, filters)
+        )
+    (count, rows), counts = await asyncio.to_thread(run)
+  return render(request['path'], 'POST', template,
+    results=search_results(count, rows, page), search_term=search_term,
+    filters=filters, facets=counts)
+
+ROUTES = [
+  ('GET', re.compile(r'^/venues$'), venues),
+  ('GET', re.compile(r'^/artists$'), artists),
+  ('GET', re.compile(r'^/shows$'), shows),
+  ('GET', re.compile(r'^/venues/(?P<id>\d+)$'), lambda request, id: detail(request, Venue, id)),
+  ('GET', re.compile(r'^/artists/(?P<id>\d+)$'), lambda request, id: detail(request, Artist, id)),
+  ('POST', re.compile(r'^/venues/search$'),
+    lambda request: search(request, Venue, 'pages/search_venues.html')),
+  ('POST', re.compile(r'^/artists/search$'),
+    lambda request: search(request, Artist, 'pages/search_artists.html')),
+]
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+wsgi = WsgiToAsgi(app)
+
+async def read_body(receive):
+  body = b''
+  while True:
+    message = await receive()
+    body += message.get('body', b'')
+    if not message.get('more_body'):
+      return body
+
+async def lifespan(receive, send):
+  while True:
+    message = await receive()
+    if message['type'] == 'lifespan.startup':
+      await send({'type': 'lifespan.startup.complete'})
+    elif message['type'] == 'lifespan.shutdown':
+      await engine.dispose()
+      await send({'type': 'lifespan.shutdown.complete'})
+      return
+
+async def application(scope, receive, send):
+  if scope['type'] == 'lifespan':
+    return await lifespan(receive, send)
+  if scope['type'] == 'http':
+    for method, pattern, view in ROUTES:
+      found = pattern.match(scope['path'])
+      if found and scope['method'] == method:
+        request = {
+          'path': scope['path'],
+          'query': parse_qs(scope.get('query_string', b'').decode()),
+          'form': parse_qs((await read_body(receive)).decode()) if method == 'POST' else {},
+        }
+        status, body, headers = await view(request, **found.groupdict())
+        await send({
+          'type': 'http.response.start',
+          'status': status,
+          'headers': [(b'content-type', b'text/html; charset=utf-8')] + [
+            (name.encode('latin-1'), value.encode('latin-1')) for name, value in headers
+          ],
+        })
+        await send({'type': 'http.response.body', 'body': body.encode('utf-8')})
+        return
+  return await wsgi(scope, receive, send)
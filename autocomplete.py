@@ -0,0 +1,181 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from flask import jsonify, request, url_for
+from sqlalchemy import event
+from models import db, Venue, Artist
+from routing import read_only
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# GET /autocomplete?q=<prefix>&limit=<k> suggests venues and artists whose
+# name, or a word in it, starts with the prefix. Names are kept in sorted
+# lists in memory, so a lookup is two binary searches and a short scan and
+# never queries the database. The lists are loaded on first use, follow
+# the commits of this process, and are reloaded every AUTOCOMPLETE_REFRESH
+# seconds to pick up writes made by other workers.
+
+KINDS = {
+  Venue: 'venue',
+  Artist: 'artist',
+}
+
+# kind: (endpoint, argument) of its page.
+PAGES = {
+  'venue': ('show_venue', 'venue_id'),
+  'artist': ('show_artist', 'artist_id'),
+}
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+  # Lowercase, accents stripped, runs of anything else than letters and
+  # digits folded to one space.
+  text = unicodedata.normalize('NFKD', text or '')
+  text = ''.join(char for char in text if not unicodedata.combining(char))
+  return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def entry_keys(name):
+  # The whole normalized name, and the rest of it from each later word,
+  # so "the musical hop" is found by "mus" and "hop" too.
+  key = normalize(name)
+  words = [match.start() for match in re.finditer(r'\w+', key)]
+  return key, [key[start:] for start in words[1:]]
+
+
+class PrefixIndex(object):
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.names = {}
+    self.full = []
+    self.words = []
+
+  def load(self, rows):
+    # rows are (kind, id, name).
+    names, full, words = {}, [], []
+    for kind, id, name in rows:
+      names[(kind, id)] = name
+      key, rests = entry_keys(name)
+      full.append((key, kind, id))
+      words.extend((rest, kind, id) for rest in rests)
+    full.sort()
+    words.sort()
+    with self.lock:
+      self.names, self.full, self.words = names, full, words
+
+  def add(self, kind, id, name):
+    with self.lock:
+      self._remove(kind, id)
+      self.names[(kind, id)] = name
+      key, rests = entry_keys(name)
+      insort(self.full, (key, kind, id))
+      for rest in rests:
+        insort(self.words, (rest, kind, id))
+
+  def remove(self, kind, id):
+    with self.lock:
+      self._remove(kind, id)
+
+  def _remove(self, kind, id):
+    name = self.names.pop((kind, id), None)
+    if name is None:
+      return
+    key, rests = entry_keys(name)
+    for entries, entry in [(self.full, (key, kind, id))] + [(self.words, (rest, kind, id)) for rest in rests]:
+      i = bisect_left(entries, entry)
+      if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+  def lookup(self, prefix, limit):
+    # Names starting with the prefix first, then names with a later word
+    # starting with it; alphabetical within each group.
+    prefix = normalize(prefix)
+    if not prefix:
+      return []
+    found, seen = [], set()
+    with self.lock:
+      for entries in (self.full, self.words):
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(found) < limit:
+          key, kind, id = entries[i]
+          if not key.startswith(prefix):
+            break
+          if (kind, id) not in seen:
+            seen.add((kind, id))
+            found.append((kind, id, self.names[(kind, id)]))
+          i += 1
+    return found
+
+
+class Autocomplete(object):
+
+  def __init__(self, app=None):
+    self.index = PrefixIndex()
+    self.loaded_at = None
+    self.load_lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.refresh = app.config.get('AUTOCOMPLETE_REFRESH', 300)
+    event.listen(db.session, 'after_flush', self._collect)
+    event.listen(db.session, 'after_commit', self._apply)
+    event.listen(db.session, 'after_rollback', self._discard)
+    app.add_url_rule('/autocomplete', 'autocomplete', read_only(self.view))
+
+  def ensure_loaded(self):
+    if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh:
+      return
+    with self.load_lock:
+      if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh:
+        return
+      rows = []
+      for model, kind in KINDS.items():
+        rows.extend((kind, id, name) for id, name in db.session.query(model.id, model.name))
+      self.index.load(rows)
+      self.loaded_at = time.monotonic()
+
+  def view(self):
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    self.ensure_loaded()
+    return jsonify({
+      "data": [
+        {
+          "type": kind,
+          "id": id,
+          "name": name,
+          "url": url_for(PAGES[kind][0], **{PAGES[kind][1]: id})
+        } for kind, id, name in self.index.lookup(request.args.get('q', ''), limit)
+      ]
+    })
+
+  def _collect(self, session, flush_context):
+    changes = session.info.setdefault('autocomplete', {})
+    for obj in list(session.new) + list(session.dirty):
+      if type(obj) in KINDS:
+        # A soft-deleted venue has deleted_at set.
+        changes[(KINDS[type(obj)], obj.id)] = None if getattr(obj, 'deleted_at', None) else obj.name
+    for obj in session.deleted:
+      if type(obj) in KINDS:
+        changes[(KINDS[type(obj)], obj.id)] = None
+
+  def _apply(self, session):
+    changes = session.info.pop('autocomplete', None)
+    if not changes or self.loaded_at is None:
+      return
+    for (kind, id), name in changes.items():
+      if name is None:
+        self.index.remove(kind, id)
+      else:
+        self.index.add(kind, id, name)
+
+  def _discard(self, session):
+    session.info.pop('autocomplete', None)
@@ -0,0 +1,75 @@
+"""Time rendering the /shows template with string vs datetime start times.
+
+"before" replays the old path: start times serialized with strftime and
+parsed back inside the filter, with the Babel pattern and locale resolved
+per call. "after" hands the template datetime objects and uses the
+filter with its precompiled patterns. No database is needed:
+
+    python benchmarks/format_datetime.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Only scratch databases here, so the public development key will do.
+os.environ.setdefault('FLASK_CONFIG', 'development')
+
+import babel.dates
+from flask import render_template
+from app import app, format_datetime
+
+
+def old_format_datetime(value, format='medium'):
+  date = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ')
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def rows(count, as_string):
+  start = datetime(2026, 1, 1, 20, 0)
+  for i in range(count):
+    start_time = start + timedelta(hours=i)
+    yield {
+      "venue_id": i % 50,
+      "venue_name": 'Venue {0}'.format(i % 50),
+      "artist_id": i % 300,
+      "artist_name": 'Artist {0}'.format(i % 300),
+      "artist_image_link": 'https://example.com/{0}.jpg'.format(i % 300),
+      "start_time": start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ') if as_string else start_time,
+      "cursor": '{0},{1}'.format(start_time.isoformat(), i),
+    }
+
+
+def measure(label, count, repeat, as_string, filter):
+  app.jinja_env.filters['datetime'] = filter
+  best = None
+  for _ in range(repeat):
+    with app.test_request_context('/shows'):
+      started = time.perf_counter()
+      render_template('pages/shows.html', shows=rows(count, as_string), per_page=count)
+      elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  print('{0:>7}: {1:8.1f} ms for {2} rows (best of {3})'.format(label, best * 1000, count, repeat))
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--rows', type=int, default=10000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  before = measure('before', args.rows, args.repeat, True, old_format_datetime)
+  after = measure('after', args.rows, args.repeat, False, format_datetime)
+  app.jinja_env.filters['datetime'] = format_datetime
+  print('speedup: {0:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,89 @@
+"""Compare requests/second of the sync (WSGI) and async (ASGI) servers.
+
+Start both servers against the same database, then point the load test at
+them. Each one gets `--concurrency` clients requesting the read-only pages
+in a loop for `--duration` seconds:
+
+    gunicorn app:app --workers 4 --bind :8000
+    uvicorn asgi:application --workers 4 --port 8001
+    pip install httpx
+    python benchmarks/load_test.py sync=http://localhost:8000 async=http://localhost:8001
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import httpx
+
+PATHS = [
+  ('GET', '/venues', None),
+  ('GET', '/artists', None),
+  ('GET', '/shows', None),
+  ('GET', '/venues/{venue_id}', None),
+  ('GET', '/artists/{artist_id}', None),
+  ('POST', '/venues/search', {'search_term': 'venue'}),
+  ('POST', '/artists/search', {'search_term': 'artist'}),
+]
+
+
+async def client(http, deadline, args, latencies, errors):
+  while time.perf_counter() < deadline:
+    method, path, data = random.choice(PATHS)
+    path = path.format(
+      venue_id=random.randint(1, args.venues),
+      artist_id=random.randint(1, args.artists)
+    )
+    started = time.perf_counter()
+    try:
+      response = await http.request(method, path, data=data)
+      ok = response.status_code < 500
+    except httpx.HTTPError:
+      ok = False
+    if ok:
+      latencies.append(time.perf_counter() - started)
+    else:
+      errors.append(path)
+
+
+async def run(label, url, args):
+  latencies, errors = [], []
+  limits = httpx.Limits(max_connections=args.concurrency)
+  async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as http:
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*[
+      client(http, deadline, args, latencies, errors) for _ in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+  latencies.sort()
+  if not latencies:
+    print('{0:<8} no successful requests, {1} errors'.format(label, len(errors)))
+    return
+  print('{0:<8} {1:8.1f} req/s  p50 {2:7.1f} ms  p95 {3:7.1f} ms  p99 {4:7.1f} ms  {5} errors'.format(
+    label,
+    len(latencies) / elapsed,
+    statistics.median(latencies) * 1000,
+    latencies[int(len(latencies) * 0.95)] * 1000,
+    latencies[int(len(latencies) * 0.99)] * 1000,
+    len(errors)
+  ))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('targets', nargs='+', metavar='LABEL=URL', help='servers to compare')
+  parser.add_argument('--concurrency', type=int, default=64)
+  parser.add_argument('--duration', type=float, default=30, help='seconds per server')
+  parser.add_argument('--timeout', type=float, default=30, help='seconds per request')
+  parser.add_argument('--venues', type=int, default=5000, help='highest venue id to request')
+  parser.add_argument('--artists', type=int, default=20000, help='highest artist id to request')
+  args = parser.parse_args()
+
+  for target in args.targets:
+    label, _, url = target.partition('=')
+    asyncio.run(run(label, url, args))
+
+
+if __name__ == '__main__':
+  main()
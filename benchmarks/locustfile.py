@@ -0,0 +1,58 @@
+"""Locust scenario: visitors browsing the catalog.
+
+Run it against a server on a database seeded by generate.py (use the same
+--venues/--artists counts for FYYUR_VENUES/FYYUR_ARTISTS):
+
+    pip install locust
+    locust -f benchmarks/locustfile.py --host http://localhost:8000 \\
+      --users 200 --spawn-rate 20 --run-time 5m --headless --json > locust.json
+"""
+import os
+import random
+import re
+from locust import HttpUser, between, task
+
+VENUES = int(os.environ.get('FYYUR_VENUES', 5000))
+ARTISTS = int(os.environ.get('FYYUR_ARTISTS', 20000))
+TERMS = ['new', 'york', 'jazz', 'austin', 'club', 'hall', 'a']
+NEXT_CURSOR = re.compile(r'cursor=([^"&]+)')
+
+
+def popular(count):
+  # Low ids, the busiest venues and artists in generated data, are
+  # visited most.
+  return min(int(random.paretovariate(0.8)), count)
+
+
+class Visitor(HttpUser):
+  wait_time = between(0.5, 3)
+
+  @task(4)
+  def venue(self):
+    self.client.get('/venues/{0}'.format(popular(VENUES)), name='/venues/[id]')
+
+  @task(4)
+  def artist(self):
+    self.client.get('/artists/{0}'.format(popular(ARTISTS)), name='/artists/[id]')
+
+  @task(3)
+  def shows(self):
+    # The first page, then maybe one more through the Next link.
+    response = self.client.get('/shows')
+    cursors = [cursor for cursor in NEXT_CURSOR.findall(response.text) if cursor != 'all']
+    if cursors and random.random() < 0.3:
+      self.client.get('/shows?cursor=' + cursors[-1], name='/shows?cursor=[next]')
+
+  @task(2)
+  def search(self):
+    kind = random.choice(['venues', 'artists'])
+    self.client.post('/{0}/search'.format(kind), data={'search_term': random.choice(TERMS)},
+      name='/{0}/search'.format(kind))
+
+  @task(1)
+  def venues(self):
+    self.client.get('/venues')
+
+  @task(1)
+  def artists(self):
+    self.client.get('/artists')
@@ -0,0 +1,221 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, session, jsonify, make_response
+from sqlalchemy import event, inspect
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Cached pages carry tags naming the rows they were built from
+# ('venue:3', 'artists', ...). Committed session changes are mapped to the
+# same tags, so a write drops exactly the pages that showed the old data.
+
+def entity_tags(obj):
+  if isinstance(obj, Venue):
+    return {'venue:{0}'.format(obj.id), 'venues', 'shows'}
+  if isinstance(obj, Artist):
+    return {'artist:{0}'.format(obj.id), 'artists', 'shows'}
+  if isinstance(obj, Show):
+    # A moved show also changes the page of the venue or artist it left.
+    state = inspect(obj)
+    venue_ids = set(state.attrs.venue_id.history.sum()) | {obj.venue_id}
+    artist_ids = set(state.attrs.artist_id.history.sum()) | {obj.artist_id}
+    return {'venue:{0}'.format(id) for id in venue_ids} | {
+      'artist:{0}'.format(id) for id in artist_ids
+    } | {'venues', 'shows'}
+  return set()
+
+
+class MemoryBackend(object):
+  # In-process LRU with a per-entry TTL.
+
+  def __init__(self, maxsize=1024, ttl=60):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.lock = threading.Lock()
+    self.entries = OrderedDict()
+    self.tags = {}
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      expires, value, tags = entry
+      if expires < time.monotonic():
+        self._drop(key)
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, tags):
+    with self.lock:
+      self._drop(key)
+      self.entries[key] = (time.monotonic() + self.ttl, value, tags)
+      for tag in tags:
+        self.tags.setdefault(tag, set()).add(key)
+      while len(self.entries) > self.maxsize:
+        self._drop(next(iter(self.entries)))
+
+  def invalidate(self, tags):
+    with self.lock:
+      for tag in tags:
+        for key in list(self.tags.get(tag, ())):
+          self._drop(key)
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.tags.clear()
+
+  def size(self):
+    return len(self.entries)
+
+  def _drop(self, key):
+    entry = self.entries.pop(key, None)
+    if entry is None:
+      return
+    for tag in entry[2]:
+      keys = self.tags.get(tag)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del self.tags[tag]
+
+
+class RedisBackend(object):
+  # Shared cache for multi-process deployments; any client speaking the
+  # Redis protocol works. Tags are Redis sets of the keys they cover.
+
+  def __init__(self, url, ttl=60, prefix='fyyur:'):
+    import redis
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return None if value is None else pickle.loads(value)
+
+  def set(self, key, value, tags):
+    pipe = self.client.pipeline()
+    pipe.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+    for tag in tags:
+      pipe.sadd(self.prefix + 'tag:' + tag, key)
+      pipe.expire(self.prefix + 'tag:' + tag, self.ttl)
+    pipe.execute()
+
+  def invalidate(self, tags):
+    for tag in tags:
+      tag_key = self.prefix + 'tag:' + tag
+      keys = self.client.smembers(tag_key)
+      pipe = self.client.pipeline()
+      for key in keys:
+        pipe.delete(self.prefix + key.decode())
+      pipe.delete(tag_key)
+      pipe.execute()
+
+  def clear(self):
+    keys = list(self.client.scan_iter(self.prefix + '*'))
+    if keys:
+      self.client.delete(*keys)
+
+  def size(self):
+    return None
+
+
+class PageCache(object):
+
+  def __init__(self, app=None):
+    self.backend = None
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    name = app.config.get('CACHE_BACKEND', 'memory')
+    ttl = app.config.get('CACHE_TTL', 60)
+    if name == 'memory':
+      # Writes only invalidate the cache of the process that made them.
+      if app.config.get('WEB_CONCURRENCY', 1) > 1:
+        raise RuntimeError('the memory page cache needs WEB_CONCURRENCY=1; use CACHE_BACKEND=redis')
+      self.backend = MemoryBackend(app.config.get('CACHE_MAXSIZE', 1024), ttl)
+    elif name == 'redis':
+      self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], ttl)
+    event.listen(db.session, 'after_flush', self._collect)
+    event.listen(db.session, 'after_commit', self._flush_tags)
+    event.listen(db.session, 'after_rollback', self._discard_tags)
+    if app.config.get('EXPOSE_STATS'):
+      app.add_url_rule('/cache/stats', 'cache_stats', lambda: jsonify(self.stats()))
+    app.extensions['page_cache'] = self
+
+  def cached(self, tags=None):
+    # Cache a GET view's 200 response under its path and query string.
+    # `tags` maps the view arguments to the tags the page depends on;
+    # the view can add more while rendering with `tag()`.
+    def decorator(view):
+      @wraps(view)
+      def wrapper(**kwargs):
+        # Pending flash messages are rendered into the page, so such a
+        # request neither reads nor fills the cache.
+        if self.backend is None or session.get('_flashes'):
+          return view(**kwargs)
+        key = 'page:' + request.full_path
+        cached = self.backend.get(key)
+        if cached is not None:
+          with self.lock:
+            self.hits += 1
+          body, status, headers = cached
+          return make_response(body, status, headers).make_conditional(request)
+        with self.lock:
+          self.misses += 1
+        g.cache_tags = set(tags(**kwargs) if tags else ())
+        response = make_response(view(**kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+          self.backend.set(
+            key,
+            (response.get_data(), response.status_code, dict(response.headers)),
+            g.cache_tags
+          )
+        return response
+      return wrapper
+    return decorator
+
+  def tag(self, *tags):
+    if 'cache_tags' in g:
+      g.cache_tags.update(tags)
+
+  def invalidate(self, *tags):
+    if self.backend is not None:
+      self.backend.invalidate(tags)
+
+  def stats(self):
+    with self.lock:
+      hits, misses = self.hits, self.misses
+    lookups = hits + misses
+    return {
+      "hits": hits,
+      "misses": misses,
+      "hit_ratio": hits / float(lookups) if lookups else 0.0,
+      "size": self.backend.size() if self.backend is not None else 0
+    }
+
+  def _collect(self, session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+      tags.update(entity_tags(obj))
+
+  def _flush_tags(self, session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+      self.invalidate(*tags)
+
+  def _discard_tags(self, session):
+    session.info.pop('cache_tags', None)
@@ -0,0 +1,38 @@
+import time
+import click
+from flask.cli import with_appcontext
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry num_upcoming_shows and num_past_shows so listings
+# and searches read a column instead of counting shows. Writes through the
+# session keep them current; `flask roll-shows` moves shows that have
+# started from upcoming to past and should run every minute or so (cron,
+# or --every for a long-running process).
+
+
+@click.command('roll-shows')
+@click.option('--every', type=float, help='Keep running, once every this many seconds.')
+@with_appcontext
+def roll_shows_command(every):
+  """Move started shows from the upcoming to the past counters."""
+  while True:
+    moved = Show.roll_over()
+    db.session.commit()
+    if moved or not every:
+      click.echo('{0} shows rolled over'.format(moved))
+    if not every:
+      return
+    time.sleep(every)
+
+
+@click.command('recount-shows')
+@with_appcontext
+def recount_shows_command():
+  """Recompute every venue and artist show counter."""
+  Show.recount()
+  db.session.commit()
+  click.echo('show counters recomputed')
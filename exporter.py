@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+import zlib
+import click
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# Rows are read through a server-side cursor in batches of BATCH_SIZE and
+# serialized as they arrive, so memory stays flat whatever the table size.
+# The column names match what `flask import` reads back.
+
+BATCH_SIZE = 1000
+
+# Maintained by the app, not part of the import format.
+INTERNAL_COLUMNS = ('updated_at', 'num_upcoming_shows', 'num_past_shows', 'deleted_at')
+
+FORMATS = {
+  'csv': 'text/csv',
+  'ndjson': 'application/x-ndjson',
+}
+
+
+def export_query(kind, city=None, state=None, since=None, until=None):
+  if kind == 'shows':
+    query = db.session.query(
+      Show.id,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Show.start_time
+    ).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id)
+    located = Venue
+    if since is not None:
+      query = query.filter(Show.start_time >= since)
+    if until is not None:
+      query = query.filter(Show.start_time < until)
+    order = (Show.start_time, Show.id)
+  else:
+    located = Venue if kind == 'venues' else Artist
+    query = db.session.query(*[
+      column for column in located.__table__.columns if column.name not in INTERNAL_COLUMNS
+    ])
+    if located is Venue:
+      # Table columns, so hide_deleted() does not apply.
+      query = query.filter(Venue.deleted_at.is_(None))
+    order = (located.id,)
+  if city:
+    query = query.filter(located.city == city)
+  if state:
+    query = query.filter(located.state == state)
+  return query.order_by(*order).execution_options(stream_results=True).yield_per(BATCH_SIZE)
+
+
+def _value(value):
+  if hasattr(value, 'isoformat'):
+    return value.isoformat()
+  return value
+
+
+def serialize(query, format):
+  # Yields text, one batch of rows per chunk.
+  columns = [column['name'] for column in query.column_descriptions]
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  if format == 'csv':
+    writer.writerow(columns)
+  count = 0
+  for row in query:
+    if format == 'csv':
+      writer.writerow([
+        ';'.join(value) if isinstance(value, list) else _value(value)
+        for value in row
+      ])
+    else:
+      buffer.write(json.dumps(dict(zip(columns, map(_value, row)))))
+      buffer.write('\n')
+    count += 1
+    if count % BATCH_SIZE == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue()
+
+
+def encode(chunks, gzip=False):
+  compressor = zlib.compressobj(wbits=31) if gzip else None
+  for chunk in chunks:
+    data = chunk.encode('utf-8')
+    if compressor is not None:
+      data = compressor.compress(data)
+    if data:
+      yield data
+  if compressor is not None:
+    yield compressor.flush()
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(['artists', 'shows', 'venues']))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Defaults to stdout.')
+@click.option('--gzip', is_flag=True, help='Compress the output with gzip.')
+@click.option('--city')
+@click.option('--state')
+@click.option('--since', type=click.DateTime(), help='Shows starting at or after this time.')
+@click.option('--until', type=click.DateTime(), help='Shows starting before this time.')
+@with_appcontext
+def export_command(kind, format, output, gzip, city, state, since, until):
+  """Stream venues, artists or shows as CSV or NDJSON."""
+  query = export_query(kind, city=city, state=state, since=since, until=until)
+  for data in encode(serialize(query, format), gzip=gzip):
+    output.write(data)
@@ -0,0 +1,178 @@
+import json
+import re
+from collections import Counter
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+# Filters for the venue/artist listings and searches: genre, state,
+# location ("City, ST") and seeking (talent for venues, a venue for
+# artists). They arrive as query string or form fields of those names.
+# On PostgreSQL a genre filter is an array containment (@>) answered by
+# the GIN index on genres, and every facet's counts come from one
+# GROUPING SETS query; other databases count in Python. A facet is
+# counted without its own filter (see EXCLUDES), so its other values keep
+# the counts they would have if picked instead.
+
+FACETS = ('genre', 'state', 'location', 'seeking')
+
+SEEKING = {
+  Venue: 'seeking_talent',
+  Artist: 'seeking_venue',
+}
+
+# Top values listed per facet.
+FACET_SIZE = 20
+
+# Filters left out of each facet's counts. A location also sets the state,
+# so the state counts leave both out.
+EXCLUDES = {
+  'genre': ('genre',),
+  'state': ('state', 'location'),
+  'location': ('location',),
+  'seeking': ('seeking',),
+}
+
+
+def selected(values):
+  # The facet filters set in `values` (request.args or request.form).
+  return {name: values[name].strip() for name in FACETS if values.get(name, '').strip()}
+
+
+def clauses(model, filters, dialect):
+  result = []
+  if 'genre' in filters:
+    if dialect == 'postgresql':
+      result.append(model.genres.contains([filters['genre']]))
+    else:
+      # Stored as a JSON list there.
+      pattern = re.sub(r'([\\%_])', r'\\\1', json.dumps(filters['genre']))
+      result.append(db.cast(model.genres, db.String).like('%' + pattern + '%', escape='\\'))
+  if 'state' in filters:
+    result.append(model.state == filters['state'])
+  if 'location' in filters:
+    city, _, state = filters['location'].rpartition(', ')
+    result.append(model.city == city)
+    result.append(model.state == state)
+  if 'seeking' in filters:
+    result.append(getattr(model, SEEKING[model]) == (filters['seeking'] == 'yes'))
+  return result
+
+
+def facet_filters(filters, facet):
+  # The filters a row must match to count toward `facet`.
+  return {name: value for name, value in filters.items() if name not in EXCLUDES[facet]}
+
+
+def facet_clause(model, filters, dialect, facet):
+  return db.and_(db.true(), *clauses(model, facet_filters(filters, facet), dialect))
+
+
+def counted_clause(model, filters, dialect):
+  # Rows counted toward some facet: the OR of the facets' filters, leaving
+  # out any that implies another.
+  sets = []
+  for facet in FACETS:
+    kept = frozenset(facet_filters(filters, facet).items())
+    if kept not in sets:
+      sets.append(kept)
+  if frozenset() in sets:
+    return db.true()
+  return db.or_(*[
+    db.and_(*clauses(model, dict(kept), dialect))
+    for kept in sets if not any(other < kept for other in sets)
+  ])
+
+
+def facet_query(model, filters, dialect, *criteria):
+  # Counts for the rows matching `criteria`, each facet's under its own
+  # filters: a match_<facet> column per facet for fold_facets() to check,
+  # or on PostgreSQL a count_<facet> column with a FILTER clause. Only rows
+  # counted by some facet are read; for genre and state filters that is
+  # `state = :s OR genres @> :g`, an OR of two index scans.
+  seeking = getattr(model, SEEKING[model])
+  counted = counted_clause(model, filters, dialect)
+  if dialect != 'postgresql':
+    return db.select(
+      model.genres, model.state, model.city, seeking,
+      *[facet_clause(model, filters, dialect, facet).label('match_' + facet) for facet in FACETS]
+    ).filter(counted, *criteria)
+  genre = db.func.unnest(model.genres).table_valued('genre').lateral()
+  return db.select(
+    genre.c.genre,
+    model.state,
+    model.city,
+    seeking,
+    db.func.grouping(genre.c.genre, model.state, model.city, seeking).label('grouping'),
+    *[
+      db.func.count(db.distinct(model.id)).filter(
+        facet_clause(model, filters, dialect, facet)
+      ).label('count_' + facet) for facet in FACETS
+    ]
+  ).select_from(
+    model
+  ).outerjoin(
+    genre, db.true()
+  ).filter(
+    counted, *criteria
+  ).group_by(
+    db.func.grouping_sets(
+      db.tuple_(genre.c.genre),
+      db.tuple_(model.state),
+      db.tuple_(model.state, model.city),
+      db.tuple_(seeking)
+    )
+  )
+
+
+# GROUPING() bits of (genre, state, city, seeking) left out of each set.
+GROUPING_SETS = {
+  0b0111: 'genre',
+  0b1011: 'state',
+  0b1001: 'location',
+  0b1110: 'seeking',
+}
+
+
+def _value(facet, genre, state, city, seeking):
+  if facet == 'genre':
+    return genre
+  if facet == 'state':
+    return state
+  if facet == 'location':
+    return '{0}, {1}'.format(city, state) if city and state else None
+  return None if seeking is None else ('yes' if seeking else 'no')
+
+
+def fold_facets(rows, dialect):
+  # {facet: [(value, count), ...]}, most common values first.
+  counts = {facet: Counter() for facet in FACETS}
+  for row in rows:
+    if dialect == 'postgresql':
+      genre, state, city, seeking, grouping = row[:5]
+      facet = GROUPING_SETS[grouping]
+      counts[facet][_value(facet, genre, state, city, seeking)] += row._mapping['count_' + facet]
+    else:
+      genres, state, city, seeking = row[:4]
+      if row._mapping['match_genre']:
+        for genre in set(genres or ()):
+          counts['genre'][genre] += 1
+      for facet in ('state', 'location', 'seeking'):
+        if row._mapping['match_' + facet]:
+          counts[facet][_value(facet, None, state, city, seeking)] += 1
+  for counter in counts.values():
+    counter.pop(None, None)
+    # Values whose rows all fail the other facets' filters.
+    for value in [value for value, count in counter.items() if not count]:
+      del counter[value]
+  return {
+    facet: sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:FACET_SIZE]
+    for facet, counter in counts.items()
+  }
+
+
+def facet_counts(model, filters, *criteria):
+  dialect = db.engine.dialect.name
+  return fold_facets(db.session.execute(facet_query(model, filters, dialect, *criteria)).all(), dialect)
@@ -0,0 +1,90 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import g
+from models import db
+
+#----------------------------------------------------------------------------#
+# Concurrent queries.
+#----------------------------------------------------------------------------#
+
+class FanOut(object):
+  # Runs a page's independent read statements at the same time, each on
+  # its own pooled connection from the engine the session would use, so
+  # the page waits for the slowest query instead of the sum of them. How
+  # long each query took is sent back in a Server-Timing header; the
+  # "fanout" entry is the wall time of the whole batch.
+  #
+  # The request's own transaction is ended first, so its connection goes
+  # back to the pool instead of being held while the workers wait for
+  # theirs; with N requests on a pool of N that wait would never end. The
+  # executor has as many threads as the pool has connections, so requests
+  # fan out side by side up to what the pool can serve. A request that has
+  # written keeps its transaction and runs the statements on it, to see
+  # its own changes.
+  #
+  # SQLite connections are tied to their thread, so there the statements
+  # run one after the other on the calling thread.
+
+  def __init__(self, app=None):
+    self.executor = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    capacity = options.get('pool_size', 5) + options.get('max_overflow', 10)
+    workers = app.config.get('QUERY_FANOUT_WORKERS')
+    workers = capacity if workers is None else min(workers, capacity)
+    if workers:
+      self.executor = ThreadPoolExecutor(workers, thread_name_prefix='fanout')
+    app.after_request(self._server_timing)
+
+  def run(self, **statements):
+    # Returns {name: rows} for the keyword statements.
+    started = time.perf_counter()
+    session = db.session()
+    if session.info.get('wrote') or session.new or session.dirty or session.deleted:
+      connection = session.connection()
+      results = {name: self._execute(connection, statement) for name, statement in statements.items()}
+    else:
+      results = self._fan_out(session, statements)
+    timings = g.setdefault('query_timings', [])
+    timings.extend((name, elapsed) for name, (rows, elapsed) in results.items())
+    timings.append(('fanout', time.perf_counter() - started))
+    return {name: rows for name, (rows, elapsed) in results.items()}
+
+  def _fan_out(self, session, statements):
+    engine = session.get_bind()
+    # Nothing to keep: the request has only read so far.
+    session.rollback()
+    if self.executor is None or engine.dialect.name == 'sqlite' or len(statements) < 2:
+      results = {name: self._connect(engine, statement) for name, statement in statements.items()}
+    else:
+      # Each worker runs in a copy of the request's context, so the SQL
+      # instrumentation still sees which request its queries belong to.
+      futures = {
+        name: self.executor.submit(contextvars.copy_context().run, self._connect, engine, statement)
+        for name, statement in statements.items()
+      }
+      results = {name: future.result() for name, future in futures.items()}
+    return results
+
+  @classmethod
+  def _connect(cls, engine, statement):
+    with engine.connect() as connection:
+      return cls._execute(connection, statement)
+
+  @staticmethod
+  def _execute(connection, statement):
+    started = time.perf_counter()
+    rows = connection.execute(statement).all()
+    return rows, time.perf_counter() - started
+
+  def _server_timing(self, response):
+    timings = g.pop('query_timings', None)
+    if timings:
+      response.headers.add('Server-Timing', ', '.join(
+        '{0};dur={1:.1f}'.format(name, elapsed * 1000) for name, elapsed in timings
+      ))
+    return response
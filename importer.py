@@ -0,0 +1,221 @@
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, apply_show_counts
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Rows are validated by the same forms the create pages use, then written
+# in chunks with one executemany INSERT and one commit per chunk. A chunk
+# that fails to insert is rolled back and reported; the import goes on
+# with the next one. Show rows are checked for double bookings against the
+# database and against the rows before them in the same chunk.
+
+KINDS = {
+  'venues': (Venue, VenueForm),
+  'artists': (Artist, ArtistForm),
+  'shows': (Show, ShowForm),
+}
+
+BOOLEAN_FIELDS = ('seeking_talent', 'seeking_venue')
+FALSE_VALUES = ('', '0', 'false', 'no', 'n', 'off')
+UNIQUE_FIELDS = ('phone', 'facebook_link')
+
+
+def read_rows(stream, format):
+  # Yields (line number, row dict). In CSV files genres are separated
+  # by ";".
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      if row.get('genres'):
+        row['genres'] = [genre.strip() for genre in row['genres'].split(';')]
+      yield reader.line_num, row
+  else:
+    for line_num, line in enumerate(stream, 1):
+      if line.strip():
+        yield line_num, json.loads(line)
+
+
+def row_formdata(row):
+  formdata = MultiDict()
+  for key, value in row.items():
+    if key in BOOLEAN_FIELDS:
+      if value is True or (isinstance(value, str) and value.strip().lower() not in FALSE_VALUES):
+        formdata.add(key, 'y')
+    elif isinstance(value, list):
+      for item in value:
+        formdata.add(key, item)
+    elif value is not None:
+      formdata.add(key, str(value))
+  return formdata
+
+
+class References(object):
+  # Venue and artist lookups for show rows, loaded once per import. A row
+  # may name its venue/artist by id (venue_id) or by name (venue).
+
+  def __init__(self):
+    self.maps = {}
+    for key, model in (('venue', Venue), ('artist', Artist)):
+      rows = db.session.query(model.id, model.name).all()
+      self.maps[key] = (
+        {id for id, name in rows},
+        {(name or '').lower(): id for id, name in rows}
+      )
+
+  def resolve(self, row):
+    row = dict(row)
+    for key in ('venue', 'artist'):
+      ids, names = self.maps[key]
+      ref = row.pop(key, None)
+      id = row.get(key + '_id')
+      if id not in (None, ''):
+        row[key + '_id'] = id if str(id).isdigit() and int(id) in ids else None
+      elif ref is not None:
+        row[key + '_id'] = names.get(str(ref).lower())
+    return row
+
+
+class Importer(object):
+
+  def __init__(self, kind, chunk_size):
+    self.model, self.form_class = KINDS[kind]
+    self.kind = kind
+    self.chunk_size = chunk_size
+    self.columns = [
+      field.name for field in self.form_class(meta={'csrf': False})
+    ]
+    self.references = References() if kind == 'shows' else None
+    self.taken = {}
+    if kind != 'shows':
+      for name in UNIQUE_FIELDS:
+        column = getattr(self.model, name)
+        self.taken[name] = {value for value, in db.session.query(column) if value}
+    # (venue_id, artist_id, start, end) of the show rows not yet written.
+    self.booked = []
+    self.inserted = 0
+    self.rejected = 0
+
+  def validate(self, row):
+    # Returns (values, None) for a valid row, (None, errors) otherwise.
+    if self.references is not None:
+      if not row.get('start_time'):
+        return None, {'start_time': ['This field is required.']}
+      row = self.references.resolve(row)
+    form = self.form_class(formdata=row_formdata(row), meta={'csrf': False})
+    if not form.validate():
+      return None, form.errors
+    values = {name: form[name].data for name in self.columns}
+    if self.references is not None:
+      values['venue_id'] = int(values['venue_id'])
+      values['artist_id'] = int(values['artist_id'])
+      values['duration_minutes'] = values['duration_minutes'] or DEFAULT_SHOW_MINUTES
+      if self.double_booked(values):
+        return None, {'start_time': ['The venue or the artist is already booked at that time']}
+    for name, taken in self.taken.items():
+      if values.get(name) in taken:
+        return None, {name: ['{0} is already listed'.format(values[name])]}
+    for name, taken in self.taken.items():
+      if values.get(name):
+        taken.add(values[name])
+    return values, None
+
+  def double_booked(self, values):
+    venue_id, artist_id, start = values['venue_id'], values['artist_id'], values['start_time']
+    end = start + timedelta(minutes=values['duration_minutes'])
+    for booked in self.booked:
+      if (booked[0] == venue_id or booked[1] == artist_id) and booked[2] < end and start < booked[3]:
+        return True
+    if Show.conflicts(venue_id, artist_id, start, values['duration_minutes']):
+      return True
+    self.booked.append((venue_id, artist_id, start, end))
+    return False
+
+  def run(self, rows):
+    chunk, errors, number = [], [], 0
+    for line_num, row in rows:
+      values, row_errors = self.validate(row)
+      if row_errors:
+        errors.append((line_num, row_errors))
+      else:
+        chunk.append(values)
+      if len(chunk) + len(errors) >= self.chunk_size:
+        number += 1
+        self.write(number, chunk, errors)
+        chunk, errors = [], []
+    if chunk or errors:
+      self.write(number + 1, chunk, errors)
+
+  def write(self, number, chunk, errors):
+    # Once committed, the chunk's shows are checked by Show.conflicts().
+    self.booked = []
+    self.rejected += len(errors)
+    try:
+      if chunk:
+        if self.model is Show:
+          now = datetime.now()
+          for values in chunk:
+            values['counted_past'] = values['start_time'] <= now
+        db.session.execute(self.model.__table__.insert(), chunk)
+        if self.model is Show:
+          self.touch_parents(chunk)
+      db.session.commit()
+      self.inserted += len(chunk)
+      click.echo('chunk {0}: {1} inserted, {2} rejected'.format(number, len(chunk), len(errors)))
+    except SQLAlchemyError as error:
+      db.session.rollback()
+      self.rejected += len(chunk)
+      click.echo('chunk {0}: failed, {1} rows rolled back: {2}'.format(
+        number, len(chunk), error.__class__.__name__), err=True)
+      current_app.logger.warning('import chunk %s failed: %s', number, error)
+    for line_num, row_errors in errors:
+      for field, messages in row_errors.items():
+        click.echo('  line {0}: {1}: {2}'.format(line_num, field, '; '.join(messages)), err=True)
+
+  def touch_parents(self, chunk):
+    # Core inserts skip the session's after_flush hooks, so bump the pages'
+    # updated_at and show counters here as Show inserts through the ORM
+    # would.
+    now = db.func.now()
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+      ids = {values[key] for values in chunk}
+      db.session.execute(
+        model.__table__.update().where(model.id.in_(ids)).values(updated_at=now)
+      )
+    apply_show_counts(db.session, [
+      (values['venue_id'], values['artist_id'], values['counted_past'], 1) for values in chunk
+    ])
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']),
+  help='Input format; guessed from the file extension when omitted.')
+@click.option('--chunk-size', default=1000, show_default=True,
+  help='Rows validated and inserted per transaction.')
+@with_appcontext
+def import_command(kind, source, format, chunk_size):
+  """Bulk import venues, artists or shows from CSV or JSON Lines."""
+  if format is None:
+    format = 'csv' if source.name.endswith('.csv') else 'jsonl'
+  started = time.perf_counter()
+  # The forms read their settings from the request context.
+  with current_app.test_request_context():
+    importer = Importer(kind, chunk_size)
+    importer.run(read_rows(source, format))
+  elapsed = time.perf_counter() - started
+  total = importer.inserted + importer.rejected
+  click.echo('{0} {1} imported, {2} rejected in {3:.1f}s ({4:.0f} rows/s)'.format(
+    importer.inserted, kind, importer.rejected, elapsed,
+    total / elapsed if elapsed else 0))
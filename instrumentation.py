@@ -0,0 +1,88 @@
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# SQL instrumentation.
+#----------------------------------------------------------------------------#
+
+# Hooks on every engine the app creates. Per request they count statements
+# and total database time, reported in a Server-Timing header. Statements
+# slower than SQL_SLOW_QUERY_MS are logged with their plan, and a statement
+# run more than SQL_N_PLUS_ONE_THRESHOLD times in one request is logged as
+# a likely N+1 query. Other extensions get the time of every statement by
+# adding a function to `observers` rather than timing it again.
+
+EXPLAIN = {
+  'postgresql': 'EXPLAIN ',
+  'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class QueryStats(object):
+
+  def __init__(self, app=None):
+    self.observers = []
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.extensions['query_stats'] = self
+    self.logger = app.logger.getChild('sql')
+    self.slow_ms = app.config.get('SQL_SLOW_QUERY_MS')
+    self.explain = app.config.get('SQL_EXPLAIN_SLOW_QUERIES', True)
+    self.repeat_threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD')
+    event.listen(Engine, 'before_cursor_execute', self._before)
+    event.listen(Engine, 'after_cursor_execute', self._after)
+    app.after_request(self._report)
+
+  def _before(self, conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+  def _after(self, conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    for observer in self.observers:
+      observer(elapsed)
+    if has_request_context():
+      # Appending is safe from the fan-out threads too.
+      g.setdefault('sql_queries', []).append((statement, elapsed))
+    if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+      self.logger.warning('slow query (%.1f ms): %s %r%s',
+        elapsed * 1000, statement, parameters,
+        self._plan(conn, cursor, statement, parameters, executemany))
+
+  def _plan(self, conn, cursor, statement, parameters, executemany):
+    # EXPLAIN (without ANALYZE) on a plain DBAPI cursor, so the statement
+    # is not run again and these hooks do not fire for it.
+    prefix = EXPLAIN.get(conn.dialect.name)
+    if not self.explain or prefix is None or executemany \
+        or not statement.lstrip().upper().startswith('SELECT'):
+      return ''
+    try:
+      explain = cursor.connection.cursor()
+      try:
+        explain.execute(prefix + statement, parameters)
+        plan = [' '.join(str(value) for value in row) for row in explain.fetchall()]
+      finally:
+        explain.close()
+    except Exception as error:
+      return '\n  (no plan: {0})'.format(error)
+    return ''.join('\n  ' + line for line in plan)
+
+  def _report(self, response):
+    queries = g.pop('sql_queries', None)
+    if not queries:
+      return response
+    total = sum(elapsed for statement, elapsed in queries)
+    response.headers.add('Server-Timing', 'db;desc="{0} queries";dur={1:.1f}'.format(
+      len(queries), total * 1000))
+    if self.repeat_threshold:
+      for statement, count in Counter(statement for statement, elapsed in queries).items():
+        if count > self.repeat_threshold:
+          self.logger.warning('possible N+1: %s %s ran the same statement %d times: %s',
+            request.method, request.path, count, statement)
+    self.logger.debug('%s %s: %d queries, %.1f ms',
+      request.method, request.path, len(queries), total * 1000)
+    return response
@@ -0,0 +1,210 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, request
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+# /metrics in the Prometheus text format. Every thread counts into its own
+# shard, under a lock only a scrape copying that shard also takes, so
+# recording a request or a statement does not wait on other requests and
+# builds no label dict; the shards are only summed when /metrics is
+# scraped. Statement times come from QueryStats (instrumentation.py), which
+# must be set up first. Each worker process reports its own numbers.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Shard(object):
+  # One thread's counters. A histogram series is a list of per-bucket
+  # counts (the last one is +Inf) followed by the sum of the observations.
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.requests = {}
+    self.latency = {}
+    self.render = {}
+    self.statements = [0] * (len(BUCKETS) + 2)
+
+  def merge(self, other):
+    for name in ('requests', 'latency', 'render'):
+      mine = getattr(self, name)
+      for key, value in getattr(other, name).items():
+        if name == 'requests':
+          mine[key] = mine.get(key, 0) + value
+        else:
+          mine[key] = add(mine.get(key), value)
+    self.statements = add(self.statements, other.statements)
+
+
+def add(series, other):
+  if series is None:
+    return list(other)
+  return [a + b for a, b in zip(series, other)]
+
+
+def observe(series, value):
+  series[bisect_left(BUCKETS, value)] += 1
+  series[-1] += value
+
+
+def new_series():
+  return [0] * (len(BUCKETS) + 2)
+
+
+def escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+
+  def __init__(self, app=None):
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.shards = []
+    self.retired = Shard()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    self.app = app
+    app.before_request(self._start)
+    app.after_request(self._finish)
+    app.extensions['query_stats'].observers.append(self._statement)
+    metrics = self
+
+    class TimedTemplate(app.jinja_env.template_class):
+      # Times whole-page renders; includes render inside their page.
+      def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+          return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+          shard = metrics.shard()
+          with shard.lock:
+            series = shard.render.get(self.name)
+            if series is None:
+              series = shard.render[self.name] = new_series()
+            observe(series, time.perf_counter() - started)
+
+    app.jinja_env.template_class = TimedTemplate
+    if app.config.get('EXPOSE_METRICS'):
+      app.add_url_rule('/metrics', 'metrics', self.view)
+
+  def shard(self):
+    shard = getattr(self.local, 'shard', None)
+    if shard is None:
+      # Once per thread.
+      shard = self.local.shard = Shard()
+      with self.lock:
+        self.shards.append((threading.current_thread(), shard))
+    return shard
+
+  def _start(self):
+    g.metrics_started = time.perf_counter()
+
+  def _finish(self, response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+      return response
+    shard = self.shard()
+    key = (request.endpoint, request.method, response.status_code)
+    with shard.lock:
+      shard.requests[key] = shard.requests.get(key, 0) + 1
+      series = shard.latency.get(request.endpoint)
+      if series is None:
+        series = shard.latency[request.endpoint] = new_series()
+      observe(series, time.perf_counter() - started)
+    return response
+
+  def _statement(self, elapsed):
+    shard = self.shard()
+    with shard.lock:
+      observe(shard.statements, elapsed)
+
+  def collect(self):
+    # Sum the live shards; shards of finished threads are folded into
+    # `retired` so threads started per request do not pile up.
+    with self.lock:
+      alive = []
+      for thread, shard in self.shards:
+        if thread.is_alive():
+          alive.append((thread, shard))
+        else:
+          self.retired.merge(shard)
+      self.shards = alive
+      total = Shard()
+      total.merge(self.retired)
+    for thread, shard in alive:
+      # The owning thread may be adding a series to the shard's dicts.
+      with shard.lock:
+        total.merge(shard)
+    return total
+
+  def view(self):
+    total = self.collect()
+    lines = []
+
+    def family(name, kind, help):
+      lines.append('# HELP {0} {1}'.format(name, help))
+      lines.append('# TYPE {0} {1}'.format(name, kind))
+
+    def sample(name, value, **labels):
+      if labels:
+        name += '{' + ','.join(
+          '{0}="{1}"'.format(key, escape(label)) for key, label in labels.items()
+        ) + '}'
+      lines.append('{0} {1}'.format(name, value))
+
+    def histogram(name, series, **labels):
+      count = 0
+      for bound, bucket in zip(BUCKETS + ('+Inf',), series):
+        count += bucket
+        sample(name + '_bucket', count, le=bound, **labels)
+      sample(name + '_sum', repr(float(series[-1])), **labels)
+      sample(name + '_count', count, **labels)
+
+    family('fyyur_http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+    for (endpoint, method, status), count in sorted(total.requests.items(), key=repr):
+      sample('fyyur_http_requests_total', count, endpoint=endpoint, method=method, status=status)
+    family('fyyur_http_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+    for endpoint, series in sorted(total.latency.items(), key=repr):
+      histogram('fyyur_http_request_duration_seconds', series, endpoint=endpoint)
+    family('fyyur_template_render_seconds', 'histogram', 'Page template render time.')
+    for template, series in sorted(total.render.items(), key=repr):
+      histogram('fyyur_template_render_seconds', series, template=template)
+    family('fyyur_db_statement_duration_seconds', 'histogram', 'SQL statement execution time.')
+    histogram('fyyur_db_statement_duration_seconds', total.statements)
+
+    pool = self.app.extensions.get('pool_monitor')
+    if pool is not None:
+      stats = pool.stats()
+      for key, kind, help in (
+        ('checkouts', 'counter', 'Connections checked out of the pool.'),
+        ('checked_out', 'gauge', 'Connections in use.'),
+        ('peak_checked_out', 'gauge', 'Most connections in use at once.'),
+        ('size', 'gauge', 'Connections the pool keeps open.'),
+        ('overflow', 'gauge', 'Connections open beyond the pool size.'),
+      ):
+        if stats[key] is not None:
+          name = 'fyyur_db_pool_' + key + ('_total' if kind == 'counter' else '')
+          family(name, kind, help)
+          sample(name, stats[key])
+
+    cache = self.app.extensions.get('page_cache')
+    if cache is not None:
+      stats = cache.stats()
+      for key, kind, help in (
+        ('hits', 'counter', 'Page cache hits.'),
+        ('misses', 'counter', 'Page cache misses.'),
+        ('hit_ratio', 'gauge', 'Page cache hits over lookups.'),
+        ('size', 'gauge', 'Pages in the cache.'),
+      ):
+        if stats[key] is not None:
+          name = 'fyyur_cache_' + key + ('_total' if kind == 'counter' else '')
+          family(name, kind, help)
+          sample(name, stats[key])
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
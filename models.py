@@ -1,173 +1,530 @@
-from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSQLAlchemy
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy.types import ARRAY
-from datetime import datetime
+from sqlalchemy.orm import Session, with_loader_criteria
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime, timedelta
+from itertools import groupby
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+# Genre lists are PostgreSQL arrays; SQLite, used as a stand-in by the
+# benchmarks, stores them as JSON.
+GENRES = ARRAY(db.String(60)).with_variant(db.JSON(), 'sqlite')
+
+# The name indexes use pg_trgm operator classes. Migrations create the
+# extension; this covers db.create_all() on a fresh PostgreSQL database.
+event.listen(db.Model.metadata, 'before_create', db.DDL(
+  'CREATE EXTENSION IF NOT EXISTS pg_trgm'
+).execute_if(dialect='postgresql'))
+
+# Show lengths, in minutes, for bookings made without one and at most.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+def partition_shows(rows, now):
+  # Split show rows against a single "now" so the past/upcoming lists and
+  # their counts always agree.
+  past_shows, upcoming_shows = [], []
+  for row in rows:
+    (upcoming_shows if row.start_time > now else past_shows).append(dict(row._mapping))
+  return {
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows_count": len(upcoming_shows)
+  }
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+      db.Index('ix_Venue_state_city', 'state', 'city'),
+      db.Index('ix_Venue_name_trgm', 'name',
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+      db.Index('ix_Venue_deleted_at', 'deleted_at',
+        postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
-    genres = db.Column(MutableList.as_mutable(ARRAY(db.String(60))), default=[])
+    genres = db.Column(MutableList.as_mutable(GENRES), default=[])
     phone = db.Column(db.String(120), unique=True)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120), unique=True)
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', cascade="all,delete", backref='venue', lazy=True)  
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+      onupdate=datetime.utcnow, server_default=db.func.now())
+    # Kept up to date by count_show_parents() and Show.roll_over().
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    num_past_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set by soft_delete(); see hide_deleted().
+    deleted_at = db.Column(db.DateTime)
+    shows = db.relationship('Show', cascade="all,delete", backref='venue', lazy=True,
+      passive_deletes=True)
 
-    def past_shows(self):
-      past_shows = Show.query.with_entities(
-        Show.artist_id, 
-        Show.start_time,
-        Artist.name.label('artist_name'),
-        Artist.image_link.label('artist_image_link')
-      ).join(
-        Show.venue
-      ).join(
-        Show.artist
-      ).filter(
-        Show.start_time < datetime.now(),
-        Show.venue_id == self.id
+    def soft_delete(self):
+      # Hides the venue and its shows at once and leaves deleting the past
+      # shows to `flask purge-venues`, so the request does not lock years of
+      # them. The upcoming shows, a few at most, are deleted now to free
+      # their artists' bookings. All of them leave their artists' counters
+      # now. Returns the ids of those artists; the caller commits.
+      rows = db.session.execute(
+        db.select(Show.artist_id, Show.counted_past, db.func.count(Show.id)).filter(
+          Show.venue_id == self.id
+        ).group_by(Show.artist_id, Show.counted_past)
       ).all()
+      self.deleted_at = datetime.utcnow()
+      db.session.execute(
+        Show.__table__.delete().where(Show.venue_id == self.id, ~Show.counted_past)
+      )
+      apply_show_counts(db.session, [(self.id, artist_id, past, -count) for artist_id, past, count in rows])
+      artist_ids = {artist_id for artist_id, past, count in rows}
+      if artist_ids:
+        db.session.execute(
+          Artist.__table__.update().where(Artist.id.in_(artist_ids)).values(updated_at=datetime.utcnow())
+        )
+      return artist_ids
+
+    @classmethod
+    def purge_deleted(cls, batch_size=1000):
+      # Deletes the soft-deleted venues, their shows in batches of
+      # `batch_size`, one transaction each. Returns (venues, shows) deleted.
+      ids = [id for id, in db.session.execute(
+        db.select(cls.id).filter(cls.deleted_at.isnot(None)).execution_options(include_deleted=True)
+      )]
+      shows = 0
+      while ids:
+        batch = db.select(Show.id).filter(Show.venue_id.in_(ids)).limit(batch_size).scalar_subquery()
+        deleted = db.session.execute(Show.__table__.delete().where(Show.id.in_(batch))).rowcount
+        db.session.commit()
+        shows += deleted
+        if deleted < batch_size:
+          break
+      if ids:
+        # Any show left is removed by the ON DELETE CASCADE.
+        db.session.execute(cls.__table__.delete().where(cls.id.in_(ids)))
+        db.session.commit()
+      return len(ids), shows
+
+    @classmethod
+    def detail_query(cls, id):
+      # The venue row, for statements run outside the session (fanout.py),
+      # which hide_deleted() does not see.
+      return cls.__table__.select().where(cls.id == id, cls.deleted_at.is_(None))
+
+    @classmethod
+    def version(cls, id):
+      # What the detail page depends on, read without touching its shows:
+      # the venue's updated_at, which the flush hooks below bump when one of
+      # its shows or their artists changes, and when its last show started
+      # (the page changes as shows go past), one entry of the (venue_id,
+      # start_time) index. None when the venue does not exist.
+      last_started = db.select(db.func.max(Show.start_time)).where(
+        Show.venue_id == cls.id, Show.start_time <= datetime.now()
+      ).scalar_subquery()
+      return db.session.query(cls.updated_at, last_started).filter(cls.id == id).first()
+
+    @classmethod
+    def areas_query(cls, *criteria):
+      # One query for the whole listing: every venue (matching `criteria`)
+      # with its upcoming show count, ordered so rows can be folded by
+      # city/state.
+      return db.select(
+        cls.state,
+        cls.city,
+        cls.id,
+        cls.name,
+        cls.num_upcoming_shows
+      ).filter(
+        *criteria
+      ).order_by(
+        cls.state, cls.city, cls.id
+      )
+
+    @staticmethod
+    def fold_areas(rows):
       return [
         {
-          "artist_id": show.artist_id,
-          "artist_name": show.artist_name,
-          "artist_image_link": show.artist_image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        } for show in past_shows
+          "city": city,
+          "state": state,
+          "venues": [
+            {
+              "id": row.id,
+              "name": row.name,
+              "num_upcoming_shows": row.num_upcoming_shows
+            } for row in venues
+          ]
+        } for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city))
       ]
 
-    def upcoming_shows(self):
-      upcoming_shows = Show.query.with_entities(
-        Show.artist_id, 
+    @classmethod
+    def areas(cls, *criteria):
+      return cls.fold_areas(db.session.execute(cls.areas_query(*criteria)).all())
+
+    @classmethod
+    def show_details_query(cls, id):
+      return db.select(
+        Show.artist_id,
         Show.start_time,
         Artist.name.label('artist_name'),
         Artist.image_link.label('artist_image_link')
       ).join(
-        Show.venue
-      ).join(
-        Show.artist
+        Artist, Show.artist_id == Artist.id
       ).filter(
-        Show.start_time > datetime.now(),
-        Show.venue_id == self.id
-      ).all()
-      return [
-        {
-          "artist_id": show.artist_id,
-          "artist_name": show.artist_name,
-          "artist_image_link": show.artist_image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        } for show in upcoming_shows
-      ]
-    
-    def past_shows_count(self):
-      return db.session.query(
-        db.func.count(Show.id)
-      ).filter(
-        Show.start_time < datetime.now(),
-        Show.venue_id == self.id
-      ).scalar()
+        Show.venue_id == id
+      ).order_by(
+        Show.start_time
+      )
 
-    def upcoming_shows_count(self):
-      return db.session.query(
-        db.func.count(Show.id)
-      ).filter(
-        Show.start_time > datetime.now(),
-        Show.venue_id == self.id
-      ).scalar()
+    def show_details(self):
+      now = datetime.now()
+      return partition_shows(db.session.execute(Venue.show_details_query(self.id)).all(), now)
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+      db.Index('ix_Artist_name_trgm', 'name',
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+      db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120), unique=True)
-    genres = db.Column(MutableList.as_mutable(ARRAY(db.String(60))), default=[])
+    genres = db.Column(MutableList.as_mutable(GENRES), default=[])
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120), unique=True)
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+      onupdate=datetime.utcnow, server_default=db.func.now())
+    # See Venue.num_upcoming_shows.
+    num_upcoming_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    num_past_shows = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     shows = db.relationship('Show', backref='artist', lazy=True) 
 
-    def past_shows(self):
-      past_shows = Show.query.with_entities(
-        Show.venue_id, 
-        Show.start_time,
-        Venue.name.label('venue_name'),
-        Venue.image_link.label('venue_image_link')
-      ).join(
-        Show.venue
-      ).join(
-        Show.artist
-      ).filter(
-        Show.start_time < datetime.now(),
-        Show.artist_id == self.id
-      ).all()
-      return [
-        {
-          "venue_id": show.venue_id,
-          "venue_name": show.venue_name,
-          "venue_image_link": show.venue_image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        } for show in past_shows
-      ]
+    @classmethod
+    def version(cls, id):
+      # See Venue.version().
+      last_started = db.select(db.func.max(Show.start_time)).where(
+        Show.artist_id == cls.id, Show.start_time <= datetime.now()
+      ).scalar_subquery()
+      return db.session.query(cls.updated_at, last_started).filter(cls.id == id).first()
 
-    def upcoming_shows(self):
-      upcoming_shows = Show.query.with_entities(
-        Show.venue_id, 
+    @classmethod
+    def detail_query(cls, id):
+      # See Venue.detail_query().
+      return cls.__table__.select().where(cls.id == id)
+
+    @classmethod
+    def show_details_query(cls, id):
+      return db.select(
+        Show.venue_id,
         Show.start_time,
         Venue.name.label('venue_name'),
         Venue.image_link.label('venue_image_link')
       ).join(
-        Show.venue
-      ).join(
-        Show.artist
+        Venue, Show.venue_id == Venue.id
       ).filter(
-        Show.start_time > datetime.now(),
-        Show.artist_id == self.id
-      ).all()
-      return [
-        {
-          "venue_id": show.venue_id,
-          "venue_name": show.venue_name,
-          "venue_image_link": show.venue_image_link,
-          "start_time": show.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        } for show in upcoming_shows
-      ]
+        Show.artist_id == id,
+        # Also run outside the session, see Venue.detail_query().
+        Venue.deleted_at.is_(None)
+      ).order_by(
+        Show.start_time
+      )
 
-    def past_shows_count(self):
-      return db.session.query(
-        db.func.count(Show.id)
-      ).filter(
-        Show.start_time < datetime.now(),
-        Show.artist_id == self.id
-      ).scalar()
-
-    def upcoming_shows_count(self):
-      return db.session.query(
-        db.func.count(Show.id)
-      ).filter(
-        Show.start_time > datetime.now(),
-        Show.artist_id == self.id
-      ).scalar()
+    def show_details(self):
+      now = datetime.now()
+      return partition_shows(db.session.execute(Artist.show_details_query(self.id)).all(), now)
 
 class Show(db.Model):
   __tablename__ = 'Show'
+  __table_args__ = (
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    db.Index('ix_Show_upcoming_start_time', 'start_time',
+      postgresql_where=db.text('NOT counted_past')),
+  )
   id = db.Column(db.Integer, primary_key=True)
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-  start_time = db.Column(db.DateTime(), nullable=False)
+  # active_history: the flush hooks below need the old venue, artist and
+  # time of a show moved after it was loaded, even once it has expired.
+  venue_id = db.column_property(
+    db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False),
+    active_history=True)
+  artist_id = db.column_property(
+    db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False),
+    active_history=True)
+  start_time = db.column_property(db.Column(db.DateTime(), nullable=False), active_history=True)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+    onupdate=datetime.utcnow, server_default=db.func.now())
+  # Whether the show is counted in its venue's and artist's num_past_shows
+  # (otherwise num_upcoming_shows). Set when the show is written and by
+  # roll_over() once it has started.
+  counted_past = db.column_property(
+    db.Column(db.Boolean, nullable=False, server_default=db.false(),
+      default=lambda context: context.get_current_parameters()['start_time'] <= datetime.now()),
+    active_history=True)
+  # Length of the booking. Shows listed before it was recorded have 0 and
+  # never conflict.
+  duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+    server_default=str(DEFAULT_SHOW_MINUTES))
+
+  @property
+  def end_time(self):
+    return self.start_time + timedelta(minutes=self.duration_minutes)
+
+  @classmethod
+  def conflicts(cls, venue_id, artist_id, start_time, duration_minutes):
+    # Shows of the venue or the artist overlapping the booking. No show is
+    # longer than MAX_SHOW_MINUTES, so only those starting in the window
+    # before its end are read, a range scan of the (venue_id, start_time)
+    # and (artist_id, start_time) indexes. Shows of soft-deleted venues
+    # count, as they do for the exclusion constraints.
+    end_time = start_time + timedelta(minutes=duration_minutes)
+    shows = cls.query.filter(
+      db.or_(cls.venue_id == venue_id, cls.artist_id == artist_id),
+      cls.start_time > start_time - timedelta(minutes=MAX_SHOW_MINUTES),
+      cls.start_time < end_time
+    ).order_by(cls.start_time).execution_options(include_deleted=True).all()
+    return [show for show in shows if show.duration_minutes and show.end_time > start_time]
+
+  @classmethod
+  def roll_over(cls, now=None):
+    # Moves the shows that have started since the last run from their
+    # venue's and artist's upcoming count to the past count. Returns how
+    # many shows moved; the caller commits.
+    now = now or datetime.now()
+    rows = db.session.execute(
+      db.select(cls.id, cls.venue_id, cls.artist_id).filter(
+        ~cls.counted_past, cls.start_time <= now
+      ).with_for_update()
+    ).all()
+    if rows:
+      db.session.execute(
+        cls.__table__.update().where(cls.id.in_([row.id for row in rows])).values(counted_past=True)
+      )
+      apply_show_counts(db.session, [(row.venue_id, row.artist_id, False, -1) for row in rows])
+      apply_show_counts(db.session, [(row.venue_id, row.artist_id, True, 1) for row in rows])
+    return len(rows)
+
+  @classmethod
+  def recount(cls, now=None):
+    # Recomputes every counter from the Show table, after bulk loads that
+    # bypass the session or to repair drift. The caller commits.
+    now = now or datetime.now()
+    db.session.execute(cls.__table__.update().values(counted_past=cls.start_time <= now))
+    for model, key in ((Venue, cls.venue_id), (Artist, cls.artist_id)):
+      def shows(past):
+        return db.select(db.func.count(cls.id)).where(
+          key == model.id, cls.counted_past == past, cls.venue_id.notin_(DELETED_VENUES)
+        ).scalar_subquery()
+      db.session.execute(model.__table__.update().values(
+        num_upcoming_shows=shows(False),
+        num_past_shows=shows(True)
+      ))
+
+  @staticmethod
+  def cursor(show):
+    return '{0},{1}'.format(show.start_time.isoformat(), show.id)
+
+  @staticmethod
+  def parse_cursor(cursor):
+    # Cursors are "<start_time iso>,<id>"; without one the listing starts
+    # at the first upcoming show, and "all" starts at the oldest show.
+    # Raises ValueError for anything else.
+    if cursor is None:
+      return datetime.now(), 0
+    if cursor == 'all':
+      return datetime.min, 0
+    start_time, id = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(start_time), int(id)
+
+  @classmethod
+  def listing(cls, after, limit, before=None):
+    # Keyset page of the listing: the next `limit` shows ordered by
+    # (start_time, id) strictly after the `after` cursor, and starting
+    # before `before` if given.
+    query = db.select(
+      cls.id,
+      cls.venue_id,
+      cls.artist_id,
+      cls.start_time,
+      Venue.name.label('venue_name'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+    ).join(
+      # Not the venue/artist backrefs: they only exist once the mappers
+      # are configured, which may not have happened yet.
+      Venue, cls.venue_id == Venue.id
+    ).join(
+      Artist, cls.artist_id == Artist.id
+    ).filter(
+      db.tuple_(cls.start_time, cls.id) > db.tuple_(*after)
+    ).order_by(
+      cls.start_time, cls.id
+    ).limit(limit)
+    if before is not None:
+      query = query.filter(cls.start_time < before)
+    return query
+
+
+def apply_show_counts(session, changes):
+  # `changes` are (venue_id, artist_id, past, step) tuples; each adds
+  # `step` to the venue's and the artist's past or upcoming show count.
+  totals = {}
+  for venue_id, artist_id, past, step in changes:
+    for key in ((Venue, venue_id, past), (Artist, artist_id, past)):
+      totals[key] = totals.get(key, 0) + step
+  for model in (Venue, Artist):
+    for past, column in ((False, model.num_upcoming_shows), (True, model.num_past_shows)):
+      params = [
+        {'_id': id, '_step': step}
+        for (key, id, key_past), step in totals.items()
+        if key is model and key_past == past and step
+      ]
+      if params:
+        session.execute(
+          model.__table__.update().where(model.id == db.bindparam('_id'))
+            .values({column: column + db.bindparam('_step')}),
+          params
+        )
+
+
+# A venue or an artist can't be booked for two overlapping shows. On
+# PostgreSQL exclusion constraints enforce it, so concurrent bookings
+# can't both commit; elsewhere only Show.conflicts() checks it.
+BOOKING_RANGE = "tsrange(start_time, start_time + duration_minutes * interval '1 minute')"
+
+# name: definition
+BOOKING_CONSTRAINTS = {
+  'ex_Show_{0}_booking'.format(key): 'EXCLUDE USING gist ({0} WITH =, {1} WITH &&)'.format(key, BOOKING_RANGE)
+  for key in ('venue_id', 'artist_id')
+}
+
+event.listen(Show.__table__, 'after_create', db.DDL(
+  'CREATE EXTENSION IF NOT EXISTS btree_gist'
+).execute_if(dialect='postgresql'))
+for name, definition in BOOKING_CONSTRAINTS.items():
+  event.listen(Show.__table__, 'after_create', db.DDL(
+    'ALTER TABLE "Show" ADD CONSTRAINT "{0}" {1}'.format(name, definition)
+  ).execute_if(dialect='postgresql'))
+
+
+# Soft-deleted venues, and their shows, are left out of every ORM query;
+# statements executed on a bare connection filter them themselves. Pass
+# execution_options(include_deleted=True) to see them.
+DELETED_VENUES = db.select(Venue.__table__.c.id).where(Venue.__table__.c.deleted_at.isnot(None))
+
+@event.listens_for(Session, 'do_orm_execute')
+def hide_deleted(execute_state):
+  if (
+    execute_state.is_select
+    and not execute_state.is_column_load
+    and not execute_state.is_relationship_load
+    and not execute_state.execution_options.get('include_deleted', False)
+  ):
+    execute_state.statement = execute_state.statement.options(
+      with_loader_criteria(Venue, Venue.deleted_at.is_(None)),
+      with_loader_criteria(Show, Show.venue_id.notin_(DELETED_VENUES))
+    )
+
+
+def _before(state, name):
+  history = state.attrs[name].history
+  if history.deleted:
+    return history.deleted[0]
+  if history.unchanged:
+    return history.unchanged[0]
+  return None
+
+
+@event.listens_for(db.session, 'before_flush')
+def classify_shows(session, flush_context, instances):
+  # A rescheduled show is counted again against the current time.
+  for obj in session.dirty:
+    if isinstance(obj, Show) and inspect(obj).attrs.start_time.history.has_changes():
+      obj.counted_past = obj.start_time <= datetime.now()
+
+
+@event.listens_for(db.session, 'after_flush')
+def count_show_parents(session, flush_context):
+  # Moves a show's contribution to the venue and artist counters as it is
+  # added, moved between venues/artists, rescheduled or removed.
+  changes = []
+  for obj in session.new:
+    if isinstance(obj, Show):
+      changes.append((obj.venue_id, obj.artist_id, obj.counted_past, 1))
+  for obj in session.deleted:
+    if isinstance(obj, Show):
+      state = inspect(obj)
+      changes.append((
+        _before(state, 'venue_id'), _before(state, 'artist_id'), _before(state, 'counted_past'), -1
+      ))
+  for obj in session.dirty:
+    if isinstance(obj, Show):
+      state = inspect(obj)
+      names = ('venue_id', 'artist_id', 'counted_past')
+      if any(state.attrs[name].history.has_changes() for name in names):
+        changes.append(tuple(_before(state, name) for name in names) + (-1,))
+        changes.append((obj.venue_id, obj.artist_id, obj.counted_past, 1))
+  if changes:
+    apply_show_counts(session, changes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def touch_show_parents(session, flush_context):
+  # A show being added, moved, rescheduled or removed changes its venue's
+  # and artist's pages, so bump their updated_at along with it.
+  venue_ids, artist_ids = set(), set()
+  for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+    if isinstance(obj, Show):
+      state = inspect(obj)
+      venue_ids.update(state.attrs.venue_id.history.sum(), [obj.venue_id])
+      artist_ids.update(state.attrs.artist_id.history.sum(), [obj.artist_id])
+  now = datetime.utcnow()
+  if venue_ids:
+    session.execute(
+      Venue.__table__.update().where(Venue.id.in_(venue_ids)).values(updated_at=now)
+    )
+  if artist_ids:
+    session.execute(
+      Artist.__table__.update().where(Artist.id.in_(artist_ids)).values(updated_at=now)
+    )
+
+
+# Venue columns listed on the pages of the artists playing there, and the
+# reverse.
+LINKED_COLUMNS = ('name', 'image_link')
+
+@event.listens_for(db.session, 'after_flush')
+def touch_linked_pages(session, flush_context):
+  # Renaming a venue changes the pages of the artists with shows there,
+  # and the reverse, so bump their updated_at too.
+  for model, other, key, other_key in (
+    (Venue, Artist, Show.venue_id, Show.artist_id),
+    (Artist, Venue, Show.artist_id, Show.venue_id),
+  ):
+    ids = {
+      obj.id for obj in session.dirty
+      if isinstance(obj, model)
+      and any(inspect(obj).attrs[name].history.has_changes() for name in LINKED_COLUMNS)
+    }
+    if ids:
+      session.execute(
+        other.__table__.update().where(
+          other.id.in_(db.select(other_key).where(key.in_(ids)))
+        ).values(updated_at=datetime.utcnow())
+      )
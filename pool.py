@@ -0,0 +1,50 @@
+import threading
+from flask import jsonify
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from models import db
+
+#----------------------------------------------------------------------------#
+# Connection pool usage.
+#----------------------------------------------------------------------------#
+
+class PoolMonitor(object):
+  # Counts checkouts on every pool the app creates and tracks the peak
+  # number of connections in use, to size workers against the database's
+  # connection limit: workers * (pool_size + max_overflow).
+
+  def __init__(self, app=None):
+    self.lock = threading.Lock()
+    self.checkouts = 0
+    self.in_use = 0
+    self.peak_in_use = 0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    event.listen(Pool, 'checkout', self._checkout)
+    event.listen(Pool, 'checkin', self._checkin)
+    if app.config.get('EXPOSE_STATS'):
+      app.add_url_rule('/pool/stats', 'pool_stats', lambda: jsonify(self.stats()))
+    app.extensions['pool_monitor'] = self
+
+  def stats(self):
+    pool = db.engine.pool
+    return {
+      "pool": type(pool).__name__,
+      "size": pool.size() if hasattr(pool, 'size') else None,
+      "checked_out": pool.checkedout() if hasattr(pool, 'checkedout') else self.in_use,
+      "overflow": pool.overflow() if hasattr(pool, 'overflow') else None,
+      "checkouts": self.checkouts,
+      "peak_checked_out": self.peak_in_use
+    }
+
+  def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+    with self.lock:
+      self.checkouts += 1
+      self.in_use += 1
+      self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+  def _checkin(self, dbapi_connection, connection_record):
+    with self.lock:
+      self.in_use = max(self.in_use - 1, 0)
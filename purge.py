@@ -0,0 +1,29 @@
+import time
+import click
+from flask.cli import with_appcontext
+from models import Venue
+
+#----------------------------------------------------------------------------#
+# Venue purge.
+#----------------------------------------------------------------------------#
+
+# DELETE /venues/<id> only marks the venue deleted (Venue.soft_delete());
+# every query stops seeing it and its shows at once. `flask purge-venues`
+# then deletes the rows in short batched transactions, off the request
+# path. Run it from cron, or keep it running with --every.
+
+
+@click.command('purge-venues')
+@click.option('--batch-size', default=1000, show_default=True,
+  help='Shows deleted per transaction.')
+@click.option('--every', type=float, help='Keep running, once every this many seconds.')
+@with_appcontext
+def purge_venues_command(batch_size, every):
+  """Delete soft-deleted venues and their shows."""
+  while True:
+    venues, shows = Venue.purge_deleted(batch_size)
+    if venues or not every:
+      click.echo('{0} venues and {1} shows purged'.format(venues, shows))
+    if not every:
+      return
+    time.sleep(every)
@@ -0,0 +1,101 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# Replicas are ordinary Flask-SQLAlchemy binds whose key starts with
+# "replica". Views marked with `read_only` send their queries to them in
+# turn; everything else, and any request that has already written, stays
+# on the primary.
+
+class ReplicaSet(object):
+
+  def __init__(self, db, app):
+    self.db = db
+    self.app = app
+    self.keys = sorted(
+      key for key in (app.config.get('SQLALCHEMY_BINDS') or {})
+      if key.startswith('replica')
+    )
+    self.interval = app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    self.lock = threading.Lock()
+    self.turn = itertools.cycle(self.keys)
+    self.checked = {}
+
+  def healthy(self, key, engine):
+    # Ping at most once per interval; a replica that failed is skipped
+    # until its next check passes.
+    now = time.monotonic()
+    checked_at, ok = self.checked.get(key, (None, True))
+    if checked_at is not None and now - checked_at < self.interval:
+      return ok
+    try:
+      with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+      ok = True
+    except Exception:
+      self.app.logger.warning('replica %s failed its health check', key)
+      ok = False
+    self.checked[key] = (now, ok)
+    return ok
+
+  def choose(self):
+    for _ in range(len(self.keys)):
+      with self.lock:
+        key = next(self.turn)
+      engine = self.db.get_engine(self.app, bind=key)
+      if self.healthy(key, engine):
+        return engine
+    return None
+
+
+class RoutingSession(SignallingSession):
+
+  def get_bind(self, mapper=None, clause=None):
+    if self._reads_from_replica():
+      replicas = self.app.extensions.get('replicas')
+      if replicas is None:
+        replicas = self.app.extensions['replicas'] = ReplicaSet(get_state(self.app).db, self.app)
+      engine = replicas.choose() if replicas.keys else None
+      if engine is not None:
+        return engine
+    return SignallingSession.get_bind(self, mapper, clause)
+
+  def _reads_from_replica(self):
+    # Writes, and every read after the first write of the request, go to
+    # the primary so a request always sees its own changes.
+    return (
+      has_app_context() and g.get('read_only', False)
+      and not self._flushing and not self.info.get('wrote')
+      and not (self.new or self.dirty or self.deleted)
+    )
+
+
+def pin_to_primary(session, flush_context):
+  session.info['wrote'] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    # sessionmaker() subclasses RoutingSession, and listeners added to
+    # RoutingSession itself never reach that subclass.
+    factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+    event.listen(factory, 'after_flush', pin_to_primary)
+    return factory
+
+
+def read_only(view):
+  # Mark a view whose queries may be answered by a replica.
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    g.read_only = True
+    return view(*args, **kwargs)
+  return wrapper
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Show calendar.
+#----------------------------------------------------------------------------#
+
+# Show counts per day, week or month over a start_time range. The range is
+# a filter on start_time, so a month is one scan of the (start_time, id)
+# index, and the counts are grouped in SQL with date_trunc. Weeks start
+# on Monday, as date_trunc('week') does.
+
+BUCKETS = ('day', 'week', 'month')
+
+# Range shown when `to` is not given.
+DEFAULT_SPANS = {
+  'day': timedelta(days=31),
+  'week': timedelta(weeks=12),
+  'month': timedelta(days=365),
+}
+
+# Longest range per unit. Every bucket of the range is filled in, empty
+# or not, so an unbounded range would build millions of them.
+MAX_SPANS = {
+  'day': timedelta(days=366),
+  'week': timedelta(weeks=5 * 53),
+  'month': timedelta(days=10 * 366),
+}
+
+
+def truncate(moment, unit):
+  # Start of the bucket `moment` falls in.
+  day = datetime(moment.year, moment.month, moment.day)
+  if unit == 'day':
+    return day
+  if unit == 'week':
+    return day - timedelta(days=day.weekday())
+  return day.replace(day=1)
+
+def next_bucket(start, unit):
+  if unit == 'day':
+    return start + timedelta(days=1)
+  if unit == 'week':
+    return start + timedelta(weeks=1)
+  return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def parse_range(values, now=None):
+  # (start, end, unit) from `from`, `to` (ISO dates or times, `to` is
+  # exclusive) and `bucket`. Starts today by default. Raises ValueError,
+  # also for a range longer than MAX_SPANS.
+  unit = values.get('bucket') or 'day'
+  if unit not in BUCKETS:
+    raise ValueError(unit)
+  start = values.get('from')
+  start = datetime.fromisoformat(start) if start else truncate(now or datetime.now(), 'day')
+  end = values.get('to')
+  end = datetime.fromisoformat(end) if end else start + DEFAULT_SPANS[unit]
+  if end <= start or end - start > MAX_SPANS[unit]:
+    raise ValueError(end)
+  return start, end, unit
+
+
+def bucket_expression(unit, dialect):
+  if dialect == 'postgresql':
+    return db.func.date_trunc(unit, Show.start_time)
+  # SQLite has no date_trunc; its date functions return text.
+  if unit == 'day':
+    return db.func.date(Show.start_time)
+  if unit == 'week':
+    return db.func.date(Show.start_time, '-6 days', 'weekday 1')
+  return db.func.strftime('%Y-%m-01', Show.start_time)
+
+def calendar_query(start, end, unit, dialect):
+  bucket = bucket_expression(unit, dialect).label('bucket')
+  return db.select(
+    bucket,
+    db.func.count(Show.id).label('count')
+  ).filter(
+    Show.start_time >= start,
+    Show.start_time < end
+  ).group_by(
+    bucket
+  ).order_by(
+    bucket
+  )
+
+
+def fill_buckets(rows, start, end, unit):
+  # [(bucket start, count), ...] for every bucket of the range, empty
+  # ones included.
+  counts = {datetime.fromisoformat(str(bucket)): count for bucket, count in rows}
+  buckets = []
+  bucket = truncate(start, unit)
+  while bucket < end:
+    buckets.append((bucket, counts.get(bucket, 0)))
+    bucket = next_bucket(bucket, unit)
+  return buckets
+
+def calendar(start, end, unit):
+  dialect = db.engine.dialect.name
+  return fill_buckets(db.session.execute(calendar_query(start, end, unit, dialect)).all(), start, end, unit)
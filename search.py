@@ -0,0 +1,142 @@
+import re
+import threading
+from flask import current_app
+from sqlalchemy import event
+from models import db
+from facets import clauses, facet_counts
+
+#----------------------------------------------------------------------------#
+# Name search backends.
+#----------------------------------------------------------------------------#
+
+# Every backend turns a search term into a (filter, rank) pair of SQL
+# expressions over its model, so callers can keep composing the query
+# (joins, counts, pagination) whichever backend answered it.
+
+def _like_pattern(term):
+  return '%{0}%'.format(re.sub(r'([\\%_])', r'\\\1', term))
+
+def _word_trigrams(text):
+  # Same padding pg_trgm uses, so both backends rank alike.
+  trigrams = set()
+  for word in re.findall(r'\w+', text.lower()):
+    padded = '  ' + word + ' '
+    trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+  return trigrams
+
+def _similarity(left, right):
+  if not left or not right:
+    return 0.0
+  return len(left & right) / float(len(left | right))
+
+
+class TrigramSearch(object):
+  # PostgreSQL backend: ILIKE is answered by the pg_trgm GIN index on
+  # name and hits are ranked by trigram similarity to the term.
+
+  def __init__(self, model):
+    self.model = model
+
+  def match(self, term):
+    name = self.model.name
+    return (
+      name.ilike(_like_pattern(term), escape='\\'),
+      db.func.similarity(name, term).desc()
+    )
+
+
+class MemorySearch(object):
+  # In-process fallback for databases without pg_trgm (SQLite test runs).
+  # Keeps an inverted index of raw name trigrams, rebuilt lazily after the
+  # model's rows change, and resolves matches to an id filter.
+
+  def __init__(self, model):
+    self.model = model
+    self.lock = threading.Lock()
+    self.stale = True
+    self.names = {}
+    self.postings = {}
+    for name in ('after_insert', 'after_update', 'after_delete'):
+      event.listen(model, name, self.invalidate)
+
+  def invalidate(self, *args):
+    self.stale = True
+
+  def rebuild(self):
+    names, postings = {}, {}
+    rows = db.session.query(self.model.id, self.model.name).all()
+    for id, name in rows:
+      name = (name or '').lower()
+      names[id] = (name, _word_trigrams(name))
+      for i in range(len(name) - 2):
+        postings.setdefault(name[i:i + 3], set()).add(id)
+    self.names, self.postings = names, postings
+    self.stale = False
+
+  def lookup(self, term):
+    with self.lock:
+      if self.stale:
+        self.rebuild()
+      term = term.lower()
+      if len(term) < 3:
+        candidates = self.names.keys()
+      else:
+        grams = [term[i:i + 3] for i in range(len(term) - 2)]
+        candidates = set.intersection(*[self.postings.get(gram, set()) for gram in grams])
+      hits = [id for id in candidates if term in self.names[id][0]]
+      wanted = _word_trigrams(term)
+      hits.sort(key=lambda id: (-_similarity(wanted, self.names[id][1]), id))
+      return hits
+
+  def match(self, term):
+    hits = self.lookup(term)
+    if not hits:
+      return db.false(), self.model.id
+    return (
+      self.model.id.in_(hits),
+      db.case({id: rank for rank, id in enumerate(hits)}, value=self.model.id)
+    )
+
+
+BACKENDS = {
+  'trigram': TrigramSearch,
+  'memory': MemorySearch,
+}
+
+_backends = {}
+
+def search_backend(model):
+  name = current_app.config.get('SEARCH_BACKEND')
+  if name is None:
+    name = 'trigram' if db.engine.dialect.name == 'postgresql' else 'memory'
+  key = (name, model)
+  if key not in _backends:
+    _backends[key] = BACKENDS[name](model)
+  return _backends[key]
+
+def search_page_queries(model, match, rank, page=1, per_page=20, criteria=()):
+  # One page of hits (also matching `criteria`) with their upcoming show
+  # counts, plus the total hit count.
+  rows = db.select(
+    model.id,
+    model.name,
+    model.num_upcoming_shows
+  ).filter(
+    match, *criteria
+  ).order_by(
+    rank, model.id
+  ).limit(per_page).offset((page - 1) * per_page)
+  count = db.select(db.func.count(model.id)).filter(match, *criteria)
+  return rows, count
+
+def search_page(model, term, page=1, per_page=20, filters=None):
+  # `filters` are facet filters, see facets.py.
+  match, rank = search_backend(model).match(term)
+  criteria = clauses(model, filters or {}, db.engine.dialect.name)
+  rows, count = search_page_queries(model, match, rank, page, per_page, criteria)
+  return db.session.execute(count).scalar(), db.session.execute(rows).all()
+
+def search_facets(model, term, filters):
+  # Facet counts over the hits for `term`.
+  match, rank = search_backend(model).match(term)
+  return facet_counts(model, filters, match)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# The app reads its configuration at import time.
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('SECRET_KEY', 'test')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import app as app_module
+import search
+from models import db
+
+
+class StatementCounter(object):
+
+  def __init__(self):
+    self.count = 0
+
+  def __call__(self, *args):
+    self.count += 1
+
+
+@pytest.fixture
+def app():
+  # A fresh in-memory database per test, without the page cache and
+  # with in-process indexes reloaded from it.
+  app = app_module.app
+  app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+  cache = app.extensions['page_cache']
+  backend, cache.backend = cache.backend, None
+  app_module.autocomplete.loaded_at = None
+  for index in search._backends.values():
+    index.stale = True
+  with app.app_context():
+    db.create_all()
+  yield app
+  with app.app_context():
+    db.session.remove()
+    db.drop_all()
+  cache.backend = backend
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+
+@pytest.fixture
+def statements():
+  counter = StatementCounter()
+  event.listen(Engine, 'after_cursor_execute', counter)
+  yield counter
+  event.remove(Engine, 'after_cursor_execute', counter)
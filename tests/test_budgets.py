@@ -0,0 +1,16 @@
+import pytest
+from benchmarks.generate import generate
+from benchmarks.suite import VIEWS, view_call
+
+
+@pytest.mark.parametrize('name', list(VIEWS))
+def test_view_statement_budget(app, client, statements, name):
+  method, path, data, budget = VIEWS[name]
+  with app.app_context():
+    generate(5, 10, 50)
+  call = view_call(client, method, path, data)
+  # The first call fills the in-process indexes.
+  call()
+  before = statements.count
+  call()
+  assert statements.count - before <= budget
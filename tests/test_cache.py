@@ -0,0 +1,49 @@
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+import cache
+import pool
+from models import db
+
+
+def make_app(**config):
+  app = Flask(__name__)
+  app.config.update(config)
+  return app
+
+
+class PageCache(cache.PageCache):
+  # Leaves the app's session and pool hooks as they were.
+
+  def init_app(self, app):
+    super(PageCache, self).init_app(app)
+    event.remove(db.session, 'after_flush', self._collect)
+    event.remove(db.session, 'after_commit', self._flush_tags)
+    event.remove(db.session, 'after_rollback', self._discard_tags)
+
+
+class PoolMonitor(pool.PoolMonitor):
+
+  def init_app(self, app):
+    super(PoolMonitor, self).init_app(app)
+    event.remove(Pool, 'checkout', self._checkout)
+    event.remove(Pool, 'checkin', self._checkin)
+
+
+def test_memory_cache_needs_a_single_worker():
+  with pytest.raises(RuntimeError):
+    PageCache(make_app(CACHE_BACKEND='memory', WEB_CONCURRENCY=2))
+  assert PageCache(make_app(CACHE_BACKEND='memory', WEB_CONCURRENCY=1)).backend is not None
+
+
+def test_stats_are_served_only_when_exposed():
+  hidden = make_app(CACHE_BACKEND=None)
+  PageCache(hidden)
+  PoolMonitor(hidden)
+  exposed = make_app(CACHE_BACKEND=None, EXPOSE_STATS=True)
+  PageCache(exposed)
+  PoolMonitor(exposed)
+  for path in ('/cache/stats', '/pool/stats'):
+    assert hidden.test_client().get(path).status_code == 404
+    assert path in [rule.rule for rule in exposed.url_map.iter_rules()]
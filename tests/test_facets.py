@@ -0,0 +1,39 @@
+from sqlalchemy.dialects import postgresql
+from facets import facet_counts, facet_query
+from models import db, Venue
+
+
+def add_venues(app):
+  with app.app_context():
+    db.session.add_all([
+      Venue(name='A', city='Austin', state='TX', address='1 Main St', genres=['Jazz', 'Rock']),
+      Venue(name='B', city='Dallas', state='TX', address='2 Main St', genres=['Rock']),
+      Venue(name='C', city='Boise', state='ID', address='3 Main St', genres=['Jazz'], seeking_talent=True),
+    ])
+    db.session.commit()
+
+
+def test_facet_counts_leave_out_their_own_filter(app):
+  add_venues(app)
+  with app.app_context():
+    counts = facet_counts(Venue, {'genre': 'Jazz', 'state': 'TX'})
+  # Other genres are counted under the state filter only, other states
+  # under the genre filter only.
+  assert counts['genre'] == [('Rock', 2), ('Jazz', 1)]
+  assert counts['state'] == [('ID', 1), ('TX', 1)]
+  assert counts['location'] == [('Austin, TX', 1)]
+  assert counts['seeking'] == [('no', 1)]
+
+
+def test_location_filter_is_left_out_of_state_counts(app):
+  add_venues(app)
+  with app.app_context():
+    counts = facet_counts(Venue, {'location': 'Austin, TX'})
+  assert counts['state'] == [('TX', 2), ('ID', 1)]
+  assert counts['location'] == [('Austin, TX', 1), ('Boise, ID', 1), ('Dallas, TX', 1)]
+
+
+def test_facet_query_reads_only_rows_some_facet_counts():
+  query = facet_query(Venue, {'genre': 'Jazz', 'state': 'TX'}, 'postgresql')
+  where = str(query.whereclause.compile(dialect=postgresql.dialect()))
+  assert where == '"Venue".state = %(state_1)s OR "Venue".genres @> %(genres_1)s::VARCHAR(60)[]'
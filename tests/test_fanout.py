@@ -0,0 +1,20 @@
+from app import fanout
+from models import db, Venue
+
+
+def test_fan_out_releases_the_request_connection(app):
+  with app.test_request_context():
+    Venue.version(1)
+    assert db.session().in_transaction()
+    rows = fanout.run(venue=Venue.detail_query(1), shows=Venue.show_details_query(1))
+    assert rows == {'venue': [], 'shows': []}
+    assert not db.session().in_transaction()
+
+
+def test_fan_out_after_a_write_stays_in_its_transaction(app):
+  with app.test_request_context():
+    db.session.add(Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'))
+    db.session.flush()
+    rows = fanout.run(venue=Venue.detail_query(1), shows=Venue.show_details_query(1))
+    assert [row.name for row in rows['venue']] == ['Hall']
+    db.session.rollback()
@@ -0,0 +1,35 @@
+import io
+from datetime import datetime
+from importer import Importer, read_rows
+from models import db, Venue, Artist, Show
+
+ROWS = '''venue_id,artist_id,start_time,duration_minutes
+1,1,2030-01-01 20:00:00,120
+1,2,2030-01-01 21:00:00,60
+2,1,2030-01-01 21:30:00,60
+2,2,2030-01-01 19:00:00,60
+1,1,2030-01-02 18:00:00,60
+'''
+
+
+def test_import_rejects_double_bookings(app):
+  with app.test_request_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Venue(id=2, name='Club', city='Austin', state='TX', address='2 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Artist(id=2, name='Duo', city='Austin', state='TX'),
+    ])
+    db.session.add(Show(venue_id=1, artist_id=2, start_time=datetime(2030, 1, 2, 18, 30), duration_minutes=60))
+    db.session.commit()
+    importer = Importer('shows', chunk_size=10)
+    importer.run(read_rows(io.StringIO(ROWS), 'csv'))
+    # Line 3 overlaps line 2 at venue 1, line 4 overlaps it for artist 1,
+    # line 6 overlaps the show already booked at venue 1.
+    assert (importer.inserted, importer.rejected) == (2, 3)
+    starts = sorted(start for start, in db.session.query(Show.start_time))
+    assert starts == [
+      datetime(2030, 1, 1, 19),
+      datetime(2030, 1, 1, 20),
+      datetime(2030, 1, 2, 18, 30),
+    ]
@@ -0,0 +1,24 @@
+from flask import Flask
+from app import metrics
+from instrumentation import QueryStats
+from metrics import Metrics
+
+
+def statement_count():
+  return sum(metrics.collect().statements[:-1])
+
+
+def test_statements_are_timed_once(client, statements):
+  before, counted = statement_count(), statements.count
+  assert client.get('/venues').status_code == 200
+  assert statement_count() - before == statements.count - counted > 0
+
+
+def test_metrics_are_served_only_when_exposed(client):
+  assert client.get('/metrics').status_code == 404
+  exposed = Flask(__name__)
+  exposed.config['EXPOSE_METRICS'] = True
+  # Without an app, QueryStats adds no engine hooks.
+  exposed.extensions['query_stats'] = QueryStats()
+  Metrics(exposed)
+  assert exposed.test_client().get('/metrics').status_code == 200
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Show
+
+
+def test_deleted_venue_frees_upcoming_bookings_only(app, client):
+  now = datetime.now().replace(microsecond=0)
+  past, upcoming = now - timedelta(days=1), now + timedelta(days=1)
+  with app.app_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Show(venue_id=1, artist_id=1, start_time=past, duration_minutes=60, counted_past=True),
+      Show(venue_id=1, artist_id=1, start_time=upcoming, duration_minutes=60, counted_past=False),
+    ])
+    db.session.commit()
+  assert client.delete('/venues/1').status_code == 200
+  with app.app_context():
+    # The past show stays until the purge, and still holds its booking
+    # as the exclusion constraints see it.
+    assert Show.conflicts(2, 1, upcoming, 60) == []
+    assert [show.start_time for show in Show.conflicts(2, 1, past, 60)] == [past]
+    assert db.session.query(Show).execution_options(include_deleted=True).count() == 1
+
+
+def counters():
+  return (
+    db.session.query(Venue.id, Venue.num_upcoming_shows, Venue.num_past_shows).order_by(Venue.id).all(),
+    db.session.query(Artist.id, Artist.num_upcoming_shows, Artist.num_past_shows).order_by(Artist.id).all(),
+  )
+
+
+def test_moving_and_rescheduling_a_saved_show_keeps_counters(app):
+  now = datetime.now().replace(microsecond=0)
+  with app.app_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Venue(id=2, name='Club', city='Austin', state='TX', address='2 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Artist(id=2, name='Duo', city='Austin', state='TX'),
+      Show(id=1, venue_id=1, artist_id=1, start_time=now + timedelta(days=1)),
+      Show(id=2, venue_id=1, artist_id=1, start_time=now - timedelta(days=1)),
+    ])
+    db.session.commit()
+    # Loaded in the transaction before, so its attributes are expired.
+    moved, rescheduled = Show.query.get(1), Show.query.get(2)
+    moved.venue_id, moved.artist_id = 2, 2
+    db.session.commit()
+    rescheduled.start_time = now + timedelta(days=2)
+    db.session.commit()
+    counted = counters()
+    Show.recount()
+    db.session.commit()
+    assert counted == counters()
+    assert counted[0] == [(1, 1, 0), (2, 1, 0)]
+
+
+def test_moving_a_saved_show_touches_and_tags_the_old_venue(app):
+  with app.app_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Venue(id=2, name='Club', city='Austin', state='TX', address='2 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Show(id=1, venue_id=1, artist_id=1, start_time=datetime(2030, 1, 1, 20)),
+    ])
+    db.session.commit()
+    db.session.execute(Venue.__table__.update().values(updated_at=datetime(2020, 1, 1)))
+    db.session.commit()
+    show = Show.query.get(1)
+    show.venue_id = 2
+    db.session.flush()
+    assert {'venue:1', 'venue:2'} <= db.session.info['cache_tags']
+    db.session.commit()
+    assert [venue.updated_at > datetime(2020, 1, 1) for venue in Venue.query.order_by(Venue.id)] == [True, True]
@@ -0,0 +1,23 @@
+from benchmarks.generate import generate
+
+# Pages that must run the same number of statements however many venues,
+# artists and shows there are.
+PAGES = ('/venues', '/venues/1', '/artists/1')
+
+
+def statement_counts(app, client, statements, scale):
+  with app.app_context():
+    generate(5 * scale, 10 * scale, 50 * scale)
+  counts = {}
+  for path in PAGES:
+    before = statements.count
+    response = client.get(path)
+    assert response.status_code == 200, path
+    counts[path] = statements.count - before
+  return counts
+
+
+def test_statement_count_does_not_grow_with_rows(app, client, statements):
+  small = statement_counts(app, client, statements, 1)
+  large = statement_counts(app, client, statements, 10)
+  assert small == large
@@ -0,0 +1,61 @@
+import pytest
+from flask import g
+from flask_sqlalchemy import get_state
+from models import db, Venue
+
+
+@pytest.fixture
+def replica(app):
+  # A second in-memory database as the only replica.
+  binds = app.config.get('SQLALCHEMY_BINDS')
+  app.config['SQLALCHEMY_BINDS'] = {'replica0': 'sqlite://'}
+  app.extensions.pop('replicas', None)
+  with app.app_context():
+    engine = db.get_engine(app, bind='replica0')
+    db.Model.metadata.create_all(engine)
+  yield engine
+  app.config['SQLALCHEMY_BINDS'] = binds
+  app.extensions.pop('replicas', None)
+  get_state(app).connectors.pop('replica0', None)
+  engine.dispose()
+
+
+def venue_row(name):
+  return {'id': 1, 'name': name, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St'}
+
+
+def test_read_only_views_use_the_replica(app, client, replica):
+  with app.app_context():
+    db.session.execute(Venue.__table__.insert(), venue_row('On the primary'))
+    db.session.commit()
+  with replica.begin() as connection:
+    connection.execute(Venue.__table__.insert(), venue_row('On the replica'))
+  page = client.get('/venues/1').get_data(as_text=True)
+  assert 'On the replica' in page
+  assert 'On the primary' not in page
+
+
+def test_writes_use_the_primary(app, client, replica):
+  with app.app_context():
+    db.session.execute(Venue.__table__.insert(), venue_row('Before'))
+    db.session.commit()
+  with replica.begin() as connection:
+    connection.execute(Venue.__table__.insert(), venue_row('Before'))
+  response = client.post('/venues/1/edit', data={
+    'name': 'After', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+    'genres': 'Jazz', 'phone': '512-555-0100', 'facebook_link': 'https://www.facebook.com/after',
+  })
+  assert response.status_code == 302
+  with app.app_context():
+    assert db.session.query(Venue.name).scalar() == 'After'
+  with replica.connect() as connection:
+    assert connection.execute(db.select(Venue.name)).scalar() == 'Before'
+
+
+def test_reads_after_a_flush_use_the_primary(app, replica):
+  with app.test_request_context():
+    g.read_only = True
+    db.session.add(Venue(**venue_row('Flushed')))
+    db.session.flush()
+    assert db.session.query(Venue.name).scalar() == 'Flushed'
+    db.session.rollback()
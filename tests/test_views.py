@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from werkzeug.http import http_date
+from models import db, Venue, Artist, Show
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs in a new interpreter, so no mapper has been configured yet.
+FIRST_REQUEST = '''
+import sys
+from app import app
+from models import db
+with app.app_context():
+  db.create_all()
+status = app.test_client().get(sys.argv[1]).status_code
+sys.exit(0 if status == 200 else status)
+'''
+
+
+def first_request_status(path):
+  env = dict(os.environ, DATABASE_URL='sqlite://', SECRET_KEY='test')
+  result = subprocess.run(
+    [sys.executable, '-c', FIRST_REQUEST, path], cwd=ROOT, env=env,
+    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+  return result.returncode, result.stdout.decode(errors='replace')
+
+
+@pytest.mark.parametrize('path', ['/shows', '/calendar', '/api/v1/shows', '/export/shows'])
+def test_show_listing_as_first_request(path):
+  returncode, output = first_request_status(path)
+  assert returncode == 0, output
+
+
+@pytest.mark.parametrize('path', ['/calendar', '/api/v1/calendar'])
+@pytest.mark.parametrize('query, status', [
+  ('from=2030-01-01&to=2031-01-01', 200),
+  ('from=2030-01-01&to=2031-01-03', 400),
+  ('from=2030-01-01&to=2034-12-31&bucket=week', 200),
+  ('from=0001-01-01&to=9999-12-31&bucket=week', 400),
+  ('from=2030-01-01&to=2039-12-01&bucket=month', 200),
+  ('from=0001-01-01&to=9999-12-31&bucket=month', 400),
+])
+def test_calendar_range_is_capped(client, path, query, status):
+  assert client.get('{0}?{1}'.format(path, query)).status_code == status
+
+
+def test_last_modified_follows_shows_going_past(app, client):
+  started = datetime.now().replace(microsecond=0) - timedelta(minutes=5)
+  with app.app_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Show(venue_id=1, artist_id=1, start_time=started, duration_minutes=60),
+    ])
+    db.session.commit()
+    # Nothing was edited since long before the show started.
+    for model in (Venue, Artist, Show):
+      db.session.execute(model.__table__.update().values(updated_at=datetime(2020, 1, 1)))
+    db.session.commit()
+  response = client.get('/venues/1')
+  assert response.last_modified == started.astimezone(timezone.utc)
+  # A copy from before the show started is stale, even without its ETag.
+  before = http_date(started.astimezone(timezone.utc) - timedelta(minutes=1))
+  assert client.get('/venues/1', headers={'If-Modified-Since': before}).status_code == 200
+  current = http_date(response.last_modified)
+  assert client.get('/venues/1', headers={'If-Modified-Since': current}).status_code == 304
+
+
+def test_renaming_an_artist_changes_its_venues_etag(app, client):
+  with app.app_context():
+    db.session.add_all([
+      Venue(id=1, name='Hall', city='Austin', state='TX', address='1 Main St'),
+      Artist(id=1, name='Band', city='Austin', state='TX'),
+      Show(venue_id=1, artist_id=1, start_time=datetime(2030, 1, 1, 20), duration_minutes=60),
+    ])
+    db.session.commit()
+  etag = client.get('/venues/1').get_etag()[0]
+  with app.app_context():
+    Artist.query.get(1).name = 'Renamed'
+    db.session.commit()
+  response = client.get('/venues/1', headers={'If-None-Match': '"{0}"'.format(etag)})
+  assert response.status_code == 200
+  assert 'Renamed' in response.get_data(as_text=True)